@@ -0,0 +1,244 @@
+"""Benchmarks of gribtool on synthetic GRIB files.
+
+The files are generated locally from the eccodes samples, so the results
+only depend on the machine and the versions of gribtool and eccodes. Each
+case times opening a GribSet (eagerly, lazily and from an index),
+filtering, decoding, printing, releasing and saving, and records the peak
+memory. Results are printed as a table and can be written as JSON. Run
+it from the root of the repository, so gribtool is importable:
+
+    python -m benchmarks.bench_gribtool --messages 500 --grid 360x181 \\
+        --output bench.json
+
+filter_cached repeats the filter of filter_first on the same GribSet, so
+it only differs from filter_first when --repeat is more than 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from gribapi import (
+    grib_clone,
+    grib_new_from_samples,
+    grib_release,
+    grib_set,
+    grib_set_values,
+    grib_write,
+)
+
+import gribtool as gt
+
+SAMPLES = {1: "regular_ll_pl_grib1", 2: "regular_ll_pl_grib2"}
+PARAMETERS = ["t", "u", "v", "r", "z"]
+LEVELS = [1000, 925, 850, 700, 500, 400, 300, 250, 200, 150, 100, 50]
+
+
+def generate(filename, edition, n_messages, ni, nj, packing):
+    """Write a GRIB file of n_messages on a global ni x nj grid."""
+    template = grib_new_from_samples(SAMPLES[edition])
+    grib_set(template, "Ni", ni)
+    grib_set(template, "Nj", nj)
+    grib_set(template, "latitudeOfFirstGridPointInDegrees", 90.0)
+    grib_set(template, "longitudeOfFirstGridPointInDegrees", 0.0)
+    grib_set(template, "latitudeOfLastGridPointInDegrees", -90.0)
+    grib_set(
+        template, "longitudeOfLastGridPointInDegrees", 360.0 - 360.0 / ni
+    )
+    grib_set(template, "iDirectionIncrementInDegrees", 360.0 / ni)
+    grib_set(template, "jDirectionIncrementInDegrees", 180.0 / (nj - 1))
+    grib_set(template, "packingType", packing)
+    grib_set(template, "bitsPerValue", 16)
+
+    rng = np.random.default_rng(0)
+    lat = np.linspace(90, -90, nj)[:, None]
+    lon = np.linspace(0, 360, ni, endpoint=False)[None, :]
+    field = (np.cos(np.radians(lat)) * np.sin(np.radians(2 * lon))).ravel()
+    with open(filename, "wb") as f:
+        for i in range(n_messages):
+            gid = grib_clone(template)
+            grib_set(gid, "shortName", PARAMETERS[i % len(PARAMETERS)])
+            grib_set(gid, "level", LEVELS[i // len(PARAMETERS) % len(LEVELS)])
+            grib_set(gid, "step", 6 * (i // (len(PARAMETERS) * len(LEVELS))))
+            values = 280 + 20 * field + rng.normal(0, 1, field.size)
+            grib_set_values(gid, values)
+            grib_write(gid, f)
+            grib_release(gid)
+    grib_release(template)
+
+
+def measure(func, repeat, setup=None):
+    """Return the best time of func over repeat runs and its peak memory.
+
+    If setup is given, its result is passed to func and is not timed.
+    Python allocations are traced, eccodes' own allocations are not.
+    """
+    times = []
+    peak = 0
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func(arg) if setup is not None else func()
+        times.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        release(result)
+        release(arg)
+    return {
+        "best_s": min(times),
+        "mean_s": sum(times) / len(times),
+        "peak_python_bytes": peak,
+    }
+
+
+def release(result):
+    if isinstance(result, gt.GribSet):
+        result.release()
+    elif isinstance(result, list):
+        for item in result:
+            release(item)
+
+
+def run_case(filename, repeat, tmpdir):
+    results = {}
+    output = os.path.join(tmpdir, "saved.grb")
+    index_dir = os.path.join(tmpdir, "index")
+    os.makedirs(index_dir, exist_ok=True)
+
+    results["open"] = measure(lambda: gt.GribSet(filename), repeat)
+    results["open_lazy"] = measure(
+        lambda: gt.GribSet(filename, lazy=True), repeat
+    )
+    gt.config.set_config(index_dir=index_dir)
+    try:
+        # The first run builds the index, the next ones reuse it
+        results["open_indexed"] = measure(
+            lambda: gt.GribSet(filename, index=True), repeat + 1
+        )
+    finally:
+        gt.config.set_config(index_dir=None)
+
+    results["filter_first"] = measure(
+        lambda gribset: gribset.filter(shortName="t", level=850),
+        repeat,
+        setup=lambda: gt.GribSet(filename),
+    )
+    results["str"] = measure(
+        str, repeat, setup=lambda: gt.GribSet(filename, lazy=True)
+    )
+    with gt.GribSet(filename) as gribset:
+        results["filter_cached"] = measure(
+            lambda: gribset.filter(shortName="t", level=850), repeat
+        )
+        subset = gribset.filter(level__in=[850, 500])
+        results["get_values"] = measure(subset.get_values, repeat)
+        results["get_values_threads"] = measure(
+            lambda: subset.get_values(workers=os.cpu_count()), repeat
+        )
+        results["save"] = measure(lambda: gribset.save(output), repeat)
+        subset.release()
+
+    def overlapping_slices():
+        gribset = gt.GribSet(filename)
+        slices = [gribset[i:i + 10] for i in range(0, len(gribset), 5)]
+        return [gribset] + slices
+
+    def release_all(gribsets):
+        for gribset in reversed(gribsets):
+            gribset.release()
+
+    results["release"] = measure(
+        release_all, repeat, setup=overlapping_slices
+    )
+    results["scan"] = measure(
+        lambda: gt.scanner.scan(filename), repeat
+    )
+    results["copy_raw"] = measure(
+        lambda: gt.copy(filename, output, shortName="t"), repeat
+    )
+    return results
+
+
+def parse_grid(grid):
+    ni, nj = grid.lower().split("x")
+    return int(ni), int(nj)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[360])
+    parser.add_argument("--grid", nargs="+", default=["360x181"])
+    parser.add_argument("--edition", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--packing", nargs="+", default=["grid_simple"])
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="runs of each case, the best being kept (filter_cached only "
+        "differs from filter_first when more than 1)",
+    )
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    cases = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for edition in args.edition:
+            for packing in args.packing:
+                for grid in args.grid:
+                    for n_messages in args.messages:
+                        ni, nj = parse_grid(grid)
+                        filename = os.path.join(tmpdir, "bench.grb")
+                        generate(filename, edition, n_messages, ni, nj,
+                                 packing)
+                        case = {
+                            "edition": edition,
+                            "packing": packing,
+                            "grid": [ni, nj],
+                            "messages": n_messages,
+                            "file_bytes": os.path.getsize(filename),
+                            "results": run_case(filename, args.repeat,
+                                                tmpdir),
+                        }
+                        cases.append(case)
+                        print_case(case)
+                        os.remove(filename)
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        # Reported in KiB on Linux
+        max_rss *= 1024
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "max_rss_bytes": max_rss,
+        "cases": cases,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def print_case(case):
+    print(
+        f"GRIB{case['edition']} {case['packing']}"
+        f" {case['grid'][0]}x{case['grid'][1]}"
+        f" {case['messages']} messages ({case['file_bytes']} bytes)"
+    )
+    for name, result in case["results"].items():
+        print(
+            f"  {name:>20}  {1000 * result['best_s']:10.3f} ms"
+            f"  {result['peak_python_bytes'] / 2**20:8.2f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
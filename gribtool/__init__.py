@@ -1 +1,6 @@
 from .base import GribMessage, GribSet
+from .index import FileIndex
+from .streaming import stream
+from .io import copy
+from . import stats
+from .ensemble import EnsembleStats, ensemble_stats
@@ -0,0 +1,68 @@
+"""Run blocking eccodes work from asyncio code.
+
+The async methods of GribSet and GribMessage run their synchronous
+counterpart in a shared pool of threads, so the event loop keeps serving
+other tasks while eccodes reads, decodes or encodes. At most
+rcParams.async_workers calls run at once, and further calls wait on a
+semaphore without queueing work, so a burst of requests cannot create
+an unbounded number of handles or arrays.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import gribtool.config
+
+_lock = threading.Lock()
+_executor = None
+_executor_workers = None
+# Semaphores are bound to the event loop they are used from
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_limit():
+    """Return the maximum number of concurrent async calls."""
+    workers = gribtool.config.rcParams.async_workers
+    if workers is None:
+        # The default of ThreadPoolExecutor
+        workers = min(32, (os.cpu_count() or 1) + 4)
+    if workers < 1:
+        raise ValueError("async_workers must be at least 1")
+    return workers
+
+
+def get_executor():
+    """Return the shared executor, resized if async_workers changed."""
+    global _executor, _executor_workers
+    workers = get_limit()
+    with _lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="gribtool-aio"
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def _get_semaphore(loop, limit):
+    semaphore = _semaphores.get(loop)
+    if semaphore is None or semaphore[0] != limit:
+        semaphore = (limit, asyncio.Semaphore(limit))
+        _semaphores[loop] = semaphore
+    return semaphore[1]
+
+
+async def run(func, *args, **kwargs):
+    """Run func in the shared executor once a slot is free."""
+    loop = asyncio.get_running_loop()
+    limit = get_limit()
+    async with _get_semaphore(loop, limit):
+        return await loop.run_in_executor(
+            get_executor(), functools.partial(func, *args, **kwargs)
+        )
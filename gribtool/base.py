@@ -1,4 +1,10 @@
+import glob
 import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
 import numpy as np
 import numpy.ma as ma
@@ -6,80 +12,151 @@ from gribapi import (
     grib_clone,
     grib_get,
     grib_get_double,
+    grib_get_message,
+    grib_get_message_offset,
     grib_get_string,
     grib_get_values,
     grib_keys_iterator_get_name,
     grib_keys_iterator_new,
     grib_keys_iterator_next,
     grib_new_from_file,
+    grib_new_from_message,
     grib_release,
     grib_set,
     grib_set_values,
-    grib_write,
 )
-from gribapi.errors import KeyValueNotFoundError
+from gribapi.errors import (
+    FunctionNotImplementedError,
+    GribInternalError,
+    KeyValueNotFoundError,
+)
+from gribapi.gribapi import GRIB_CHECK, ffi, get_handle, lib
 
+import gribtool.aio
 import gribtool.config
+import gribtool.geometry
+import gribtool.io
+import gribtool.parallel
+import gribtool.query
+import gribtool.scanner
+from gribtool.index import FileIndex
+from gribtool.io import FileReader
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class _Registry:
-    gribmessages = {}
-    gribsets = {}
+    """Reference counts of the eccodes handles held by live objects.
+
+    Every registered GribMessage or GribSet holds one reference to each
+    distinct handle it contains. A handle held by a single object can be
+    released together with it. Objects are tracked through weak
+    references, and their references are dropped by a finalizer if they
+    are garbage collected without being unregistered. Objects may be
+    created and released from several threads, e.g. by the async API.
+
+    Each message knows the registered objects holding it, so that a
+    handle created or released while they are alive, e.g. that of a lazy
+    message, is added to or dropped from all of them.
+    """
+
+    lock = threading.RLock()
+    refcounts = {}
+    gribmessages = weakref.WeakKeyDictionary()
+    gribsets = weakref.WeakKeyDictionary()
+    _finalizers = weakref.WeakKeyDictionary()
 
     @classmethod
-    def register(cls, item):
-        key = id(item)
+    def _registry_of(cls, item):
         if isinstance(item, GribMessage):
-            cls.gribmessages[key] = [item.gid]
+            return cls.gribmessages
         elif isinstance(item, GribSet):
-            cls.gribsets[key] = [msg.gid for msg in item.messages]
+            return cls.gribsets
         else:
             raise TypeError("Item must be GribMessage or GribSet instance")
 
+    @classmethod
+    def _incref(cls, gids):
+        for gid in gids:
+            cls.refcounts[gid] = cls.refcounts.get(gid, 0) + 1
+
+    @classmethod
+    def _decref(cls, gids):
+        with cls.lock:
+            for gid in gids:
+                count = cls.refcounts.get(gid, 0) - 1
+                if count > 0:
+                    cls.refcounts[gid] = count
+                else:
+                    cls.refcounts.pop(gid, None)
+
+    @classmethod
+    def register(cls, item):
+        registry = cls._registry_of(item)
+        with cls.lock:
+            if isinstance(item, GribMessage):
+                messages = [item]
+                gids = {item.gid}
+            else:
+                # Lazy messages are added when materialized, see attach()
+                messages = item.messages
+                gids = {msg._gid for msg in messages if msg.loaded}
+            if item in registry:
+                if registry[item] == gids:
+                    return
+                cls.unregister(item)
+            registry[item] = gids
+            cls._incref(gids)
+            cls._finalizers[item] = weakref.finalize(
+                item, cls._decref, gids
+            )
+            for msg in messages:
+                msg._holders.add(item)
+
+    @classmethod
+    def attach(cls, msg):
+        """Record a new handle of msg for every object holding msg."""
+        with cls.lock:
+            for holder in list(msg._holders):
+                gids = cls._registry_of(holder).get(holder)
+                if gids is not None and msg._gid not in gids:
+                    gids.add(msg._gid)
+                    cls._incref([msg._gid])
+
+    @classmethod
+    def detach(cls, msg):
+        """Drop the handle of msg, about to be released, from its holders."""
+        with cls.lock:
+            for holder in list(msg._holders):
+                gids = cls._registry_of(holder).get(holder)
+                if gids is not None and msg._gid in gids:
+                    gids.discard(msg._gid)
+                    cls._decref([msg._gid])
+
     @classmethod
     def unregister(cls, item):
-        key = id(item)
-        if isinstance(item, GribMessage):
-            if key in cls.gribmessages:
-                del cls.gribmessages[key]
-        elif isinstance(item, GribSet):
-            del cls.gribsets[key]
-        else:
-            raise TypeError("Item must be GribMessage or GribSet instance")
+        with cls.lock:
+            gids = cls._registry_of(item).pop(item, None)
+            if gids is not None:
+                cls._finalizers.pop(item).detach()
+                cls._decref(gids)
+                if isinstance(item, GribMessage):
+                    item._holders.discard(item)
+                else:
+                    for msg in item.messages:
+                        msg._holders.discard(item)
 
     @classmethod
     def all_gids(cls):
-        gids = []
-        for gids in cls.gribmessages.values():
-            gids.extend(gids)
-        for gids in cls.gribsets.values():
-            gids.extend(gids)
-        return set(gids)
+        return set(cls.refcounts)
 
     @classmethod
     def find_unique_gids(cls, element):
-        """Find unique gids the elements of the register."""
-        # join dictionaries
-        dictionary = {**cls.gribmessages, **cls.gribsets}
-        key = id(element)
-        if len(dictionary) == 0:
-            return []
-        if len(dictionary) == 1:
-            return dictionary[key]
-        # list of all items NOT in the key
-        others_items = [
-            item for k, v in dictionary.items() if k != key for item in v
-        ]
-
-        # list of unique items in the key which are not in others_items
-        unique_gids = [
-            item for item in dictionary[key] if item not in others_items
-        ]
-
-        return unique_gids
+        """Find the gids of element not held by any other object."""
+        with cls.lock:
+            gids = cls._registry_of(element).get(element, ())
+            return [gid for gid in gids if cls.refcounts.get(gid) == 1]
 
     def __str__(self):
         return (
@@ -91,7 +168,106 @@ class _Registry:
         return len(self.gribmessages) + len(self.gribsets)
 
 
+class _HandlePool:
+    """Least recently used handles of messages that can be recreated.
+
+    If rcParams.max_handles is set, the handles of messages unchanged
+    since they were read from a file are released when more than that
+    many are alive, and recreated from the file on their next access.
+    Modified messages and messages pinned by a running operation are
+    never released. As handles may be released from any thread, eccodes
+    is only called on a handle while its message is pinned, see
+    GribMessage._pinned.
+    """
+
+    messages = OrderedDict()
+    # Shared with the registry, as releasing a handle updates both
+    lock = _Registry.lock
+
+    @classmethod
+    def touch(cls, msg):
+        """Mark the handle of msg as the most recently used."""
+        max_handles = gribtool.config.rcParams.max_handles
+        if max_handles is None:
+            return
+        key = id(msg)
+        with cls.lock:
+            if key in cls.messages:
+                cls.messages.move_to_end(key)
+            else:
+                cls.messages[key] = weakref.ref(
+                    msg, lambda ref: cls.messages.pop(key, None)
+                )
+            cls._evict(max_handles, keep=msg)
+
+    @classmethod
+    def discard(cls, msg):
+        with cls.lock:
+            cls.messages.pop(id(msg), None)
+
+    @classmethod
+    def _evict(cls, max_handles, keep):
+        excess = len(cls.messages) - max_handles
+        if excess <= 0:
+            return
+        # Entries are taken from the least recently used end, the ones in
+        # use going back to the other end, each entry being seen once
+        for _ in range(len(cls.messages)):
+            if excess <= 0:
+                break
+            key, ref = cls.messages.popitem(last=False)
+            msg = ref()
+            if msg is None or not msg.loaded or msg._modified:
+                excess -= 1
+            elif msg is not keep and msg._pins == 0:
+                msg._release_handle()
+                excess -= 1
+            else:
+                cls.messages[key] = ref
+
+    def __len__(self):
+        return len(self.messages)
+
+
+def _decode_into(gid, out):
+    """Decode the values of a message straight into a 1-D array.
+
+    float64 and float32 contiguous arrays are filled in place by eccodes,
+    other arrays are filled from a temporary copy. So are float32 arrays
+    for the packings eccodes cannot decode as float, such as grid_ieee.
+    """
+    if out.dtype == np.float64:
+        func, ctype = lib.grib_get_double_array, "double *"
+    elif out.dtype == np.float32 and hasattr(lib, "grib_get_float_array"):
+        func, ctype = lib.grib_get_float_array, "float *"
+    else:
+        func = None
+    if func is None or not out.flags.c_contiguous:
+        out[:] = grib_get_values(gid)
+        return
+    length_p = ffi.new("size_t*", out.size)
+    err = func(
+        get_handle(gid), b"values", ffi.cast(ctype, out.ctypes.data), length_p
+    )
+    try:
+        GRIB_CHECK(err)
+    except FunctionNotImplementedError:
+        if out.dtype == np.float64:
+            raise
+        out[:] = grib_get_values(gid)
+        return
+    if length_p[0] != out.size:
+        raise ValueError(
+            f"Message has {length_p[0]} values, expected {out.size}"
+        )
+
+
 class GribMessage:
+    # Number of modifications of any message. Each message also counts
+    # its own in _version, used to invalidate the key tables cached by
+    # the GribSets holding it
+    _generation = 0
+
     def __new__(cls, *args, **kwargs):
         """Prevent instantiation of GribMessage directly"""
         raise TypeError(
@@ -99,63 +275,319 @@ class GribMessage:
             " GribMessage or slice a GribSet."
         )
 
-    def release(self):
-        # if hasattr(self, "loaded") and self.loaded:
-        if self.loaded:
-            # logger.debug("Releasing GribMessage instance %s", id(self))
-            grib_release(self.gid)
-            _Registry.unregister(self)
+    @classmethod
+    def _from_gid(cls, gid, source=None, headers=None):
+        """Wrap an eccodes handle, bypassing the instantiation guard.
+
+        source is an optional (reader, offset, length) tuple locating the
+        original bytes of the message in a file (see gribtool.io), and
+        headers an optional dict of key values known from an index.
+        """
+        msg = super().__new__(cls)
+        msg._gid = gid
+        msg.loaded = gid is not None
+        msg._source = source
+        msg._headers = headers if headers is not None else {}
+        msg._modified = False
+        msg._version = 0
+        msg._cache = {}
+        msg._pins = 0
+        # Registered objects holding the message, see _Registry
+        msg._holders = weakref.WeakSet()
+        if msg.loaded and source is not None:
+            _HandlePool.touch(msg)
+        return msg
+
+    @classmethod
+    def _from_source(cls, source, headers=None):
+        """Create a lazy message whose handle is created on first access."""
+        return cls._from_gid(None, source, headers)
+
+    @property
+    def gid(self):
+        self._materialize()
+        if not self.loaded:
+            raise ValueError("GribMessage was released")
+        if self._source is not None and not self._modified:
+            _HandlePool.touch(self)
+        return self._gid
+
+    def _materialize(self):
+        """Create the handle from the bytes of the message in its file.
+
+        This applies to lazy messages and to released messages that are
+        unchanged since they were read.
+        """
+        if self.loaded or self._source is None or self._modified:
+            return
+        reader, offset, length = self._source
+        gid = reader.new_handle(offset, length)
+        with _Registry.lock:
+            if self.loaded:
+                # Created meanwhile by another thread
+                grib_release(gid)
+                return
+            self._gid = gid
+            self.loaded = True
+            _Registry.attach(self)
+        _HandlePool.touch(self)
+
+    def _pin(self):
+        """Return the handle, kept from being released until _unpin.
+
+        The handle is created if needed. The handle pool does not release
+        pinned handles, so other threads can run meanwhile.
+        """
+        # The handle is created outside the lock, which is only held to
+        # check that it was not released meanwhile
+        if not self.loaded:
+            self._materialize()
+        with _HandlePool.lock:
+            gid = self.gid
+            self._pins += 1
+        return gid
+
+    def _unpin(self):
+        with _HandlePool.lock:
+            self._pins -= 1
+
+    @contextmanager
+    def _pinned(self):
+        """Pin the handle within the context, see _pin."""
+        gid = self._pin()
+        try:
+            yield gid
+        finally:
+            self._unpin()
+
+    @contextmanager
+    def _borrowed(self):
+        """Release on exit a handle created within the context.
+
+        Used to read keys of lazy messages into cached columns without
+        keeping a handle for each message. Handles pinned meanwhile or of
+        modified messages are kept.
+        """
+        created = not self.loaded
+        try:
+            yield self
+        finally:
+            if created:
+                with _HandlePool.lock:
+                    if self._pins == 0 and not self._modified:
+                        self._release_handle()
+
+    def _touch(self):
+        """Flag the message as modified and invalidate cached keys"""
+        self._modified = True
+        self._cache.clear()
+        self._version += 1
+        GribMessage._generation += 1
+        _HandlePool.discard(self)
+
+    def _peek(self, key, types=None):
+        """Get a key from the index headers if possible, else from eccodes.
+
+        types maps keys to the native type found in a previous message,
+        which saves eccodes the lookup of the type. It is updated with
+        the type of keys not in it.
+        """
+        if not self._modified:
+            value = self._headers.get(key, gribtool.scanner.UNKNOWN)
+            if value is not gribtool.scanner.UNKNOWN:
+                return value
+        if types is None:
+            return self[key]
+        if key not in types:
+            value = self[key]
+            types[key] = type(value)
+            return value
+        try:
+            return self[key, types[key]]
+        except KeyValueNotFoundError:
+            raise
+        except GribInternalError:
+            # The key has another native type in this message
+            return self[key]
+
+    def _release_handle(self):
+        """Release the handle, leaving the message registered."""
+        with _Registry.lock:
+            if not self.loaded:
+                return
+            _Registry.detach(self)
+            _HandlePool.discard(self)
             self.loaded = False
+            gid = self._gid
+        grib_release(gid)
+
+    def release(self):
+        # logger.debug("Releasing GribMessage instance %s", id(self))
+        self._release_handle()
+        _Registry.unregister(self)
 
     def __getitem__(self, key):
+        cache = gribtool.config.rcParams.cache_keys
+        if cache and key in self._cache:
+            return self._cache[key]
+        gid = self._pin()
         try:
             if isinstance(key, tuple) and len(key) == 2:
-                key, type_ = key
-                return grib_get(self.gid, key, type_)
+                name, type_ = key
+                value = grib_get(gid, name, type_)
             else:
-                return grib_get(self.gid, key)
+                name = key
+                value = grib_get(gid, key)
         except KeyValueNotFoundError:
             raise KeyValueNotFoundError(
-                f"Key '{key}' not found in GRIB message"
+                f"Key '{name}' not found in GRIB message"
             )
+        finally:
+            self._unpin()
+        if cache:
+            self._cache[key] = value
+        return value
+
+    def prefetch(self, keys=None):
+        """Read keys into the key cache, by default rcParams.print_keys.
+
+        Keys missing in the message are skipped. The cache is used only
+        if rcParams.cache_keys is set.
+        """
+        if keys is None:
+            keys = gribtool.config.rcParams.print_keys
+        with self._pinned() as gid:
+            for key in keys:
+                if key not in self._cache:
+                    try:
+                        self._cache[key] = grib_get(gid, key)
+                    except KeyValueNotFoundError:
+                        pass
 
     def __setitem__(self, key, value):
-        grib_set(self.gid, key, value)
+        with self._pinned() as gid:
+            grib_set(gid, key, value)
+            self._touch()
 
     def set_values(self, values):
-        if np.any(values.mask):
-            missing = grib_get(self.gid, "missingValue")
-            values[values.mask] = missing
-            grib_set_values(self.gid, values)
-            grib_set(self.gid, "bitmapPresent", 1)
+        """Encode values into the message.
+
+        Masked values are encoded as missing, with a bitmap. values is not
+        modified.
+        """
+        mask = ma.getmask(values)
+        with self._pinned() as gid:
+            if mask is not ma.nomask and np.any(mask):
+                missing = grib_get_double(gid, "missingValue")
+                grib_set(gid, "bitmapPresent", 1)
+                grib_set_values(gid, ma.filled(values, missing))
+            else:
+                grib_set_values(gid, ma.getdata(values))
+            self._touch()
+
+    def _state(self):
+        """Return what is needed to rebuild the message elsewhere.
+
+        Messages unchanged since they were read from a file are located
+        by path and offset, other messages are encoded to their bytes.
+        """
+        if self._source is not None and not self._modified:
+            reader, offset, length = self._source
+            if reader.is_unchanged():
+                return (
+                    "source",
+                    os.path.abspath(reader.filename),
+                    reader._signature,
+                    reader.use_mmap,
+                    offset,
+                    length,
+                    self._headers,
+                )
+        if not self.loaded:
+            raise ValueError("Cannot pickle a released GribMessage")
+        with self._pinned() as gid:
+            return ("bytes", grib_get_message(gid))
+
+    @classmethod
+    def _from_state(cls, state, readers=None):
+        """Rebuild an unregistered message from the result of _state.
+
+        readers caches the FileReader of each file, so that messages of
+        the same file share one.
+        """
+        if state[0] == "bytes":
+            return cls._from_gid(grib_new_from_message(state[1]))
+        _, filename, signature, use_mmap, offset, length, headers = state
+        readers = {} if readers is None else readers
+        key = (filename, signature, use_mmap)
+        if key not in readers:
+            reader = FileReader(filename, use_mmap=use_mmap)
+            if reader._signature != signature:
+                raise OSError(f"{filename} changed since it was pickled")
+            readers[key] = reader
+        return cls._from_source((readers[key], offset, length), headers)
+
+    @classmethod
+    def _unpickle(cls, state):
+        msg = cls._from_state(state)
+        _Registry.register(msg)
+        return msg
+
+    def __reduce__(self):
+        return (GribMessage._unpickle, (self._state(),))
 
     def clone(self):
-        gid = grib_clone(self.gid)
-        msg = super().__new__(GribMessage)
-        msg.gid = gid
-        msg.loaded = True
+        with self._pinned() as gid:
+            msg = GribMessage._from_gid(grib_clone(gid))
         _Registry.register(msg)
         return msg
 
+    async def aget_values(self):
+        """Decode the values without blocking the event loop."""
+        return await gribtool.aio.run(self.get_values)
+
     def get_values(self):
-        return ma.masked_values(
-            grib_get_values(self.gid),
-            grib_get_double(self.gid, "missingValue"),
-            shrink=False,
-        )
+        with self._pinned() as gid:
+            return ma.masked_values(
+                grib_get_values(gid),
+                grib_get_double(gid, "missingValue"),
+                shrink=False,
+            )
+
+    def _grid_key(self):
+        """Return the values of the keys defining the grid"""
+        keys = gribtool.geometry.grid_keys([self._peek("gridType")])
+        values = []
+        for key in keys:
+            try:
+                values.append(self._peek(key))
+            except KeyValueNotFoundError:
+                values.append(None)
+        return tuple(values)
+
+    def get_geometry(self):
+        """Return the coordinates of the grid, shared by all messages on it.
+
+        See gribtool.geometry.
+        """
+        key = self._grid_key()
+        geometry = gribtool.geometry.get_cached(key)
+        if geometry is None:
+            with self._pinned() as gid:
+                geometry = gribtool.geometry.from_handle(key, gid)
+        return geometry
 
     def _get_keys(self, print_keys):
         return {key: self[key] for key in print_keys}
 
     def _get_keys_from_namespace(self, namespace):
-        gid = self.gid
-        iterid = grib_keys_iterator_new(gid, namespace)
-
         dict_ = {}
-        while grib_keys_iterator_next(iterid):
-            keyname = grib_keys_iterator_get_name(iterid)
-            keyval = grib_get_string(gid, keyname)
-            dict_[keyname] = keyval
+        with self._pinned() as gid:
+            iterid = grib_keys_iterator_new(gid, namespace)
+            while grib_keys_iterator_next(iterid):
+                keyname = grib_keys_iterator_get_name(iterid)
+                keyval = grib_get_string(gid, keyname)
+                dict_[keyname] = keyval
         return dict_
 
     def __str__(self):
@@ -193,10 +625,29 @@ class GribMessage:
 
 
 class GribSet:
-    def __init__(self, init, headers_only=False):
+    def __init__(self, init, headers_only=False, index=None, lazy=None):
         self.messages = []
+        self.index = None
+        if index is None:
+            index = gribtool.config.rcParams.index
+        if lazy is None:
+            lazy = gribtool.config.rcParams.lazy
         if isinstance(init, str):
-            messages = self._load(filename=init, headers_only=headers_only)
+            if index or lazy:
+                # A lazy set needs the offsets of the messages, which are
+                # only persisted if indexing is enabled. Without a sidecar
+                # index, only the keys decoded by the scanner are known
+                # and others are read on demand, as indexing them would
+                # need a handle for every message
+                if index:
+                    self.index = FileIndex.open(init)
+                else:
+                    self.index = FileIndex.build(init, keys=[])
+                messages = self._load_indexed(self.index, lazy)
+            else:
+                messages = self._load(
+                    filename=init, headers_only=headers_only
+                )
         elif isinstance(init, list):
             messages = init
             for message in messages:
@@ -210,30 +661,418 @@ class GribSet:
             )
         self.messages = messages
         self.loaded = True
+        self._columns = {}
+        # Rows of the cached columns not read yet, see _read_columns
+        self._unknown = {}
+        self._columns_generation = GribMessage._generation
+        self._columns_version = self._version()
+        self._columns_lock = threading.RLock()
         _Registry.register(self)
 
+    @staticmethod
+    def _load_indexed(index, lazy=False):
+        reader = FileReader(
+            index.filename, use_mmap=gribtool.config.rcParams.mmap
+        )
+        # Headers hold the indexed keys and those known from a scan, keys
+        # the scanner could not decode being UNKNOWN (see GribMessage._peek)
+        keys = list(index.scanned) + index.keys
+        columns = list(index.scanned.values())
+        columns.extend(index.values[key] for key in index.keys)
+        rows = zip(*columns) if columns else [()] * len(index)
+        messages = []
+        for offset, length, row in zip(index.offsets, index.lengths, rows):
+            source = (reader, offset, length)
+            headers = dict(zip(keys, row))
+            if lazy:
+                msg = GribMessage._from_source(source, headers)
+            else:
+                gid = reader.new_handle(offset, length)
+                msg = GribMessage._from_gid(gid, source, headers)
+            messages.append(msg)
+        logger.debug(
+            f"Loaded {len(messages)} indexed messages from {index.filename}"
+        )
+        return messages
+
+    @classmethod
+    async def aopen(cls, init, **kwargs):
+        """Open a GribSet without blocking the event loop.
+
+        Takes the same arguments as GribSet, see gribtool.aio.
+        """
+        return await gribtool.aio.run(cls, init, **kwargs)
+
+    @classmethod
+    def open_many(cls, paths, workers=None):
+        """Open many files as a single lazy GribSet.
+
+        paths is a list of files or a glob pattern. The files are indexed
+        in parallel (with their sidecar index if rcParams.index is set),
+        the index keys of all files form the catalog of the set, and the
+        handles are created from their file only when accessed.
+        """
+        if isinstance(paths, str):
+            paths = sorted(glob.glob(paths))
+        if gribtool.config.rcParams.index:
+            open_index = FileIndex.open
+        else:
+            open_index = FileIndex.build
+        with gribtool.parallel.get_executor("thread", workers) as pool:
+            indexes = list(pool.map(open_index, paths))
+
+        messages = []
+        for index in indexes:
+            messages.extend(cls._load_indexed(index, lazy=True))
+        gribset = cls(messages)
+
+        # Seed the cached columns with the keys indexed in all files
+        keys = set(indexes[0].keys) if indexes else set()
+        for index in indexes[1:]:
+            keys &= set(index.keys)
+        for key in keys:
+            values = []
+            for index in indexes:
+                values.extend(index.values[key])
+            try:
+                gribset._columns[key] = gribtool.query.to_column(values, key)
+            except KeyValueNotFoundError:
+                # Left for _column to raise if the key is ever used
+                pass
+        logger.debug(
+            f"Opened {len(messages)} messages from {len(paths)} files"
+        )
+        return gribset
+
+    def prefetch(self, keys=None):
+        """Read keys of all messages into their key cache.
+
+        See GribMessage.prefetch.
+        """
+        for msg in self:
+            msg.prefetch(keys)
+
+    @staticmethod
+    def _materialize(msg):
+        """Create the handle of a lazy message and return the message."""
+        msg._materialize()
+        return msg
+
     def _load(self, filename, headers_only):
+        reader = FileReader(
+            filename, use_mmap=gribtool.config.rcParams.mmap
+        )
         messages = []
         with open(filename, "rb") as f:
             while True:
                 gid = grib_new_from_file(f, headers_only)
                 if gid is None:
                     break
-                msg = super().__new__(GribMessage)
-                msg.gid = gid
-                msg.loaded = True
-                messages.append(msg)
+                source = (
+                    reader,
+                    grib_get_message_offset(gid),
+                    grib_get(gid, "totalLength", int),
+                )
+                messages.append(GribMessage._from_gid(gid, source))
         logger.debug(f"Found {len(messages)} messages in {filename}")
         return messages
 
+    def _message_bytes(self, positions=None):
+        """Yield the coded bytes of each message, or of those at positions.
+
+        The bytes of messages unchanged since they were read are taken
+        from their file, without creating or encoding any handle. Each
+        file is checked once, and runs of messages of the same file are
+        read together, see FileReader.read_many.
+        """
+        if positions is None:
+            messages = self.messages
+        else:
+            messages = (self.messages[i] for i in positions)
+        unchanged = {}
+        # The run of ranges to read from the file of reader
+        reader = None
+        ranges = []
+        for msg in messages:
+            if msg._source is not None and not msg._modified:
+                source_reader, offset, length = msg._source
+                if source_reader not in unchanged:
+                    unchanged[source_reader] = source_reader.is_unchanged()
+                if unchanged[source_reader]:
+                    if source_reader is not reader and ranges:
+                        yield from reader.read_many(ranges)
+                        ranges = []
+                    reader = source_reader
+                    ranges.append((offset, length))
+                    continue
+            if ranges:
+                yield from reader.read_many(ranges)
+                ranges = []
+            with msg._pinned() as gid:
+                yield grib_get_message(gid)
+        if ranges:
+            yield from reader.read_many(ranges)
+
     def save(self, filename):
+        """Write the messages to a file.
+
+        Unmodified messages are copied from their source file and written
+        together with large vectored writes.
+        """
+        buffers = self._message_bytes()
+        if os.path.exists(filename):
+            readers = {
+                msg._source[0]
+                for msg in self.messages
+                if msg._source is not None
+            }
+            if any(
+                os.path.exists(reader.filename)
+                and os.path.samefile(reader.filename, filename)
+                for reader in readers
+            ):
+                # Read everything before the file is truncated
+                buffers = list(buffers)
         with open(filename, "wb") as f:
-            for message in self.messages:
-                grib_write(message.gid, f)
+            gribtool.io.write_buffers(f, buffers)
+
+    async def asave(self, filename):
+        """Write the messages to a file without blocking the event loop."""
+        await gribtool.aio.run(self.save, filename)
+
+    def set_values(self, values, workers=None):
+        """Encode a (n_messages, n_points) array into the messages.
+
+        Each row is encoded into its message as by GribMessage.set_values.
+        With workers, messages are encoded in parallel by a pool of
+        threads, as eccodes releases the GIL while packing.
+        """
+        shape = (len(self), self._n_points())
+        if values.shape != shape:
+            raise ValueError(f"values must have shape {shape}")
+        messages = list(self)
+        if workers is None or workers <= 1:
+            for msg, row in zip(messages, values):
+                msg.set_values(row)
+            return
+
+        def encode(chunk):
+            for i in chunk:
+                messages[i].set_values(values[i])
+
+        with gribtool.parallel.get_executor("thread", workers) as pool:
+            chunks = gribtool.parallel.split(len(messages), workers)
+            list(pool.map(encode, chunks))
+
+    def _n_points(self):
+        """Return the number of points shared by all messages"""
+        n_points = self._column("numberOfDataPoints")
+        if len(self) > 0 and np.any(n_points != n_points[0]):
+            raise ValueError("All messages must have the same grid")
+        return int(n_points[0]) if len(self) > 0 else 0
+
+    def _decode(self, out, rows, mask, workers=None, executor="thread",
+                points=None):
+        """Decode the values of each message into a row of out.
+
+        out is a (n_rows, n_points) array and rows the row of each
+        message. The rows of mask are set for messages with missing
+        points, see _has_missing.
+        If points is given, only the values at those indices are kept,
+        each message being decoded into a scratch array first.
+        """
+        messages = self.messages
+
+        def decode_row(gid, row, scratch):
+            if points is None:
+                _decode_into(gid, out[row])
+            else:
+                _decode_into(gid, scratch)
+                np.take(scratch, points, out=out[row])
+
+        n_points = self._n_points() if points is not None else None
+
+        def new_scratch():
+            if points is None:
+                return None
+            return np.empty(n_points, dtype=out.dtype)
+
+        if workers is None or workers <= 1:
+            scratch = new_scratch()
+            for msg, row in zip(messages, rows):
+                with msg._pinned() as gid:
+                    decode_row(gid, row, scratch)
+        elif executor == "thread":
+            def decode(chunk):
+                scratch = new_scratch()
+                for i in chunk:
+                    with messages[i]._pinned() as gid:
+                        decode_row(gid, rows[i], scratch)
+
+            with gribtool.parallel.get_executor(executor, workers) as pool:
+                chunks = gribtool.parallel.split(len(messages), workers)
+                list(pool.map(decode, chunks))
+        else:
+            def submit(chunk):
+                # The bytes of a chunk are only read when it is submitted
+                return pool.submit(
+                    gribtool.parallel.decode_messages,
+                    [bytes(buffer) for buffer in self._message_bytes(chunk)],
+                    out.dtype,
+                )
+
+            def store(chunk, future):
+                result = future.result()
+                if points is not None:
+                    result = result[:, points]
+                out[[rows[i] for i in chunk]] = result
+
+            # At most two chunks per worker are in flight, so the bytes of
+            # the whole set are never held at once
+            with gribtool.parallel.get_executor(executor, workers) as pool:
+                pending = deque()
+                for chunk in gribtool.parallel.split(len(messages), workers):
+                    pending.append((chunk, submit(chunk)))
+                    if len(pending) >= 2 * workers:
+                        store(*pending.popleft())
+                while pending:
+                    store(*pending.popleft())
+
+        missing = self._column("missingValue")
+        for i in np.flatnonzero(self._has_missing()):
+            np.equal(out[rows[i]], missing[i], out=mask[rows[i]])
+
+    def _has_missing(self):
+        """Return a boolean array of the messages with missing points.
+
+        Missing points are flagged by a bitmap, or without one by the
+        missing value management of GRIB2 complex packing. Both are
+        counted by numberOfMissing, the bitmap being used for messages
+        lacking the key.
+        """
+        bitmap = self._column("bitmapPresent")
+        try:
+            counts = self._column("numberOfMissing")
+        except KeyValueNotFoundError:
+            return bitmap.astype(bool)
+        return np.array(
+            [
+                bool(flag) if count is None else count > 0
+                for count, flag in zip(counts.tolist(), bitmap.tolist())
+            ],
+            dtype=bool,
+        )
+
+    def get_values(self, out=None, dtype=np.float64, workers=None,
+                   executor="thread", bbox=None):
+        """Decode the values of all messages into a single masked array.
+
+        All messages must have the same number of points. The values are
+        decoded straight into one (n_messages, n_points) array, which may
+        be given as out, and only messages with missing points are checked
+        for missing values.
+
+        With workers, messages are decoded in parallel by a pool of
+        threads, or of processes to which the raw messages are sent.
+
+        With bbox, a (north, west, south, east) bounding box, only the
+        points within it are returned, in the order of
+        get_geometry().region(bbox). All messages must share one grid.
+        """
+        points = None
+        if bbox is not None:
+            points = self.get_geometry().region(bbox)
+            shape = (len(self), len(points))
+        else:
+            shape = (len(self), self._n_points())
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"out must have shape {shape}")
+
+        mask = np.zeros(shape, dtype=bool)
+        self._decode(out, range(len(self)), mask, workers, executor, points)
+        return ma.MaskedArray(out, mask=mask, copy=False)
+
+    def get_geometry(self):
+        """Return the coordinates of the grid shared by all messages.
+
+        See gribtool.geometry.
+        """
+        if len(self) == 0:
+            raise ValueError("An empty GribSet has no grid")
+        keys = gribtool.geometry.grid_keys(set(self._column("gridType")))
+        columns = []
+        for key in keys:
+            try:
+                columns.append(self._column(key).tolist())
+            except KeyValueNotFoundError:
+                columns.append([None] * len(self))
+        grids = set(zip(*columns))
+        if len(grids) > 1:
+            raise ValueError("All messages must have the same grid")
+        (key,) = grids
+        geometry = gribtool.geometry.get_cached(key)
+        if geometry is None:
+            with self.messages[0]._pinned() as gid:
+                geometry = gribtool.geometry.from_handle(key, gid)
+        return geometry
+
+    to_array = get_values
+
+    async def aget_values(self, **kwargs):
+        """Decode all messages without blocking the event loop.
+
+        Takes the same arguments as get_values.
+        """
+        return await gribtool.aio.run(self.get_values, **kwargs)
+
+    def to_cube(self, dims, dtype=np.float64, workers=None,
+                executor="thread"):
+        """Assemble the messages into a hypercube along header keys.
+
+        Each key in dims becomes a dimension whose coordinates are the
+        sorted distinct values of the key, followed by the (Nj, Ni) grid
+        if the messages have one, else by the points. The cube is
+        allocated once and each message is decoded straight into its
+        slot; slots without a message are masked. Return the cube and a
+        dict with the coordinates of each dimension.
+        """
+        n_points = self._n_points()
+        columns = self._read_columns(dims)
+        coords = {}
+        index = np.zeros(len(self), dtype=int)
+        for dim in dims:
+            values = columns[dim].tolist()
+            coords[dim] = sorted(set(values))
+            position = {value: i for i, value in enumerate(coords[dim])}
+            index = index * len(coords[dim]) + np.array(
+                [position[value] for value in values], dtype=int
+            )
+        if len(np.unique(index)) != len(index):
+            raise ValueError(f"Several messages share coordinates in {dims}")
+
+        try:
+            ni, nj = self._read_columns(["Ni", "Nj"]).values()
+            grid = (int(nj[0]), int(ni[0]))
+            if grid[0] * grid[1] != n_points:
+                grid = (n_points,)
+        except (KeyValueNotFoundError, TypeError, IndexError):
+            grid = (n_points,)
+
+        dims_shape = tuple(len(coords[dim]) for dim in dims)
+        out = np.empty(dims_shape + (n_points,), dtype=dtype)
+        mask = np.ones(out.shape, dtype=bool)
+        flat_out = out.reshape(-1, n_points)
+        flat_mask = mask.reshape(-1, n_points)
+        flat_mask[index] = False
+        self._decode(flat_out, index, flat_mask, workers, executor)
+        cube = ma.MaskedArray(out, mask=mask, copy=False)
+        return cube.reshape(dims_shape + grid), coords
 
     def release(self):
         if hasattr(self, "messages") and len(self.messages) > 0:
-            unique_gids = _Registry.find_unique_gids(self)
+            unique_gids = set(_Registry.find_unique_gids(self))
             logger.debug(
                 f"Releasing GridFile instance {id(self)}"
                 f" with {len(self)} messages"
@@ -241,31 +1080,33 @@ class GribSet:
                 f" therefore released."
             )
             messages_to_release = [
-                msg for msg in self.messages if msg.gid in unique_gids
+                msg for msg in self.messages if msg._gid in unique_gids
             ]
             # for i, msg in enumerate(messages_to_release):
             for msg in messages_to_release:
                 if msg.loaded:
                     msg.release()
+            _Registry.unregister(self)
             self.messages = []
+            self._columns = {}
+            self._unknown = {}
             self.loaded = False
-            _Registry.unregister(self)
 
     def __getitem__(self, index):
         if isinstance(index, int):
             msg = self.messages[index]
+            msg._materialize()
             _Registry.register(msg)
             return msg
         elif isinstance(index, slice):
-            messages = self.messages[index]
-            gribset = self.__class__(messages)
-            return gribset
+            return self._subset(index)
         elif isinstance(index, tuple):
             index, key = index
             if isinstance(index, slice):
-                return [msg[key] for msg in self.messages[index]]
+                positions = np.arange(len(self))[index]
+                return self._column(key, positions).tolist()
             else:
-                return self.messages[index][key]
+                return self.messages[index]._peek(key)
         else:
             raise TypeError(
                 "Unsupported index type. Must be int or slice, or"
@@ -276,7 +1117,62 @@ class GribSet:
         return f"<GribFile with {len(self)} messages>"
 
     def __iter__(self):
-        return iter(self.messages)
+        for msg in self.messages:
+            yield self._materialize(msg)
+
+    @classmethod
+    def _unpickle(cls, states):
+        readers = {}
+        return cls(
+            [GribMessage._from_state(state, readers) for state in states]
+        )
+
+    def __reduce__(self):
+        # Messages read from files are rebuilt as lazy messages
+        return (GribSet._unpickle, ([msg._state() for msg in self.messages],))
+
+    def map(self, func, workers=None, executor="process"):
+        """Apply func to each message and return the list of results.
+
+        With workers, messages are processed in parallel by a pool of
+        processes, to which they are pickled by path and offset if they
+        are unchanged since they were read from a file, or as their
+        bytes. func and its results must then be picklable, and func is
+        given a copy of the message, so changes to it are not seen here.
+        A pool of threads may be used instead.
+        """
+        if workers is None or workers <= 1:
+            return [func(msg) for msg in self]
+        messages = self.messages
+        chunks = gribtool.parallel.split(len(messages), workers)
+        with gribtool.parallel.get_executor(executor, workers) as pool:
+            if executor == "thread":
+                def apply(chunk):
+                    results = []
+                    for i in chunk:
+                        with messages[i]._pinned():
+                            results.append(func(messages[i]))
+                    return results
+
+                futures = [pool.submit(apply, chunk) for chunk in chunks]
+            else:
+                futures = [
+                    pool.submit(
+                        gribtool.parallel.map_messages,
+                        func,
+                        [messages[i] for i in chunk],
+                    )
+                    for chunk in chunks
+                ]
+            return [result for f in futures for result in f.result()]
+
+    async def aiter(self):
+        """Iterate over the messages, creating lazy handles in a thread."""
+        for msg in self.messages:
+            if msg.loaded:
+                yield msg
+            else:
+                yield await gribtool.aio.run(self._materialize, msg)
 
     def __len__(self):
         return len(self.messages)
@@ -320,61 +1216,244 @@ class GribSet:
                 "print_keys must be a list of keys "
                 "or a string with a namespace"
             )
-        keys = dict_.keys()
+        keys = list(dict_.keys())
+
+        # Only the rows shown are read: with max_rows, the first and last
+        # max_rows // 2 rows with an ellipsis in between
+        n = len(self.messages)
+        max_rows = gribtool.config.rcParams.max_rows
+        if max_rows is None:
+            head, tail = range(n), range(0)
+        else:
+            half = max_rows // 2
+            head = range(min(n, half))
+            tail = range(max(half + 1, n - half + 1), n)
+        positions = np.array(list(head) + list(tail), dtype=int)
+        columns = {
+            key: column.tolist()
+            for key, column in self._read_columns(keys, positions).items()
+        }
 
         # Calculate the width of each column as the maximum of
-        # the length of the key and the length of the value for all messages
+        # the length of the key and the length of the values shown
         width = {key: len(key) for key in keys}
-        for msg in self.messages:
-            dict_ = msg._get_keys(keys)
-            for key, value in dict_.items():
+        for key, values in columns.items():
+            for value in values:
                 width[key] = max(width[key], len(str(value)))
 
-        # Format the headings
-        heading_str = "  ".join(f"{key:>{width[key]}}" for key in keys)
+        def format_row(j):
+            return "  ".join(
+                f"{str(columns[key][j]):>{width[key]}}" for key in keys
+            )
 
-        # Format the rows
-        max_rows = gribtool.config.rcParams.max_rows
+        lines = ["  ".join(f"{key:>{width[key]}}" for key in keys)]
+        lines.extend(format_row(j) for j in range(len(head)))
+        if max_rows is not None:
+            if n > max_rows // 2:
+                lines.append("...")
+            lines.extend(
+                format_row(j) for j in range(len(head), len(positions))
+            )
+            # append the number of records
+            lines.append(f"{n} messages")
+        lines.append("")
+        return "\n".join(lines)
 
-        if max_rows is None:
-            # If max_rows is less than 4, print all rows
-            data_str = ""
-            for i, msg in enumerate(self.messages):
-                dict_ = msg._get_keys(keys)
-                data_str += "  ".join(
-                    f"{str(dict_[key]):>{width[key]}}" for key in keys
-                )
-                data_str += "\n"
+    def _version(self):
+        """Return the number of modifications of the messages"""
+        return sum(msg._version for msg in self.messages)
+
+    def _cached_columns(self):
+        """Return the cached columns, dropping them if a message changed.
+
+        The messages are only checked after any message was modified.
+        """
+        if self._columns_generation != GribMessage._generation:
+            self._columns_generation = GribMessage._generation
+            version = self._version()
+            if version != self._columns_version:
+                self._columns = {}
+                self._unknown = {}
+                self._columns_version = version
+        return self._columns
+
+    def _read_columns(self, keys, positions=None):
+        """Return the values of keys for all messages as NumPy arrays.
+
+        Columns are read in a single pass over the messages and cached
+        until any message is modified. Messages lacking a key hold None.
+        If positions is given, only those messages are read; the values
+        read are cached all the same, and the other rows of the column
+        are read when first needed.
+        """
+        with self._columns_lock:
+            return self._read_columns_locked(keys, positions)
+
+    def _read_columns_locked(self, keys, positions):
+        columns = self._cached_columns()
+        unknown = self._unknown
+        if positions is None:
+            rows = np.arange(len(self))
         else:
-            # else print first and last with elipsis in between
-            data_str = ""
-            for i, msg in enumerate(self.messages):
-                if i < max_rows // 2:
-                    dict_ = msg._get_keys(keys)
-                    data_str += "  ".join(
-                        f"{str(dict_[key]):>{width[key]}}" for key in keys
-                    )
-                    data_str += "\n"
-                elif i == max_rows // 2:
-                    data_str += "...\n"
-                elif i > len(self.messages) - max_rows // 2:
-                    dict_ = msg._get_keys(keys)
-                    data_str += "  ".join(
-                        f"{str(dict_[key]):>{width[key]}}" for key in keys
+            rows = np.asarray(positions, dtype=int)
+        to_read = {}
+        for key in keys:
+            if key not in columns:
+                columns[key] = np.empty(len(self), dtype=object)
+                unknown[key] = np.ones(len(self), dtype=bool)
+            if key in unknown:
+                to_read[key] = rows[unknown[key][rows]]
+        if to_read:
+            types = {}
+            for i in np.unique(np.concatenate(list(to_read.values()))):
+                msg = self.messages[i]
+                with msg._borrowed():
+                    for key in to_read:
+                        if unknown[key][i]:
+                            try:
+                                columns[key][i] = msg._peek(key, types)
+                            except KeyValueNotFoundError:
+                                columns[key][i] = None
+                            unknown[key][i] = False
+            for key in to_read:
+                if not unknown[key].any():
+                    columns[key] = gribtool.query.to_column(
+                        columns[key].tolist(), key
                     )
-                    data_str += "\n"
-            # append the number of records
-            data_str += f"{len(self.messages)} messages\n"
+                    del unknown[key]
 
-        return heading_str + "\n" + data_str
+        result = {}
+        for key in keys:
+            if key in unknown:
+                result[key] = gribtool.query.to_column(
+                    columns[key][rows].tolist(), key
+                )
+            elif positions is None:
+                result[key] = columns[key]
+            else:
+                result[key] = columns[key][positions]
+        return result
+
+    def _column(self, key, positions=None):
+        return self._read_columns([key], positions)[key]
+
+    def get_keys(self, keys, as_="dict"):
+        """Return the values of keys for all messages, one column per key.
+
+        All keys are read in a single pass over the messages with their
+        native types, and cached. as_ selects the output: "dict" of lists,
+        "numpy" dict of arrays or "pandas" DataFrame. Messages lacking a
+        key hold None.
+        """
+        columns = self._read_columns(list(keys))
+        if as_ == "dict":
+            return {key: column.tolist() for key, column in columns.items()}
+        elif as_ == "numpy":
+            return columns
+        elif as_ == "pandas":
+            try:
+                import pandas as pd
+            except ImportError:
+                raise ImportError("pandas is required for as_='pandas'")
+            return pd.DataFrame(columns)
+        else:
+            raise ValueError(
+                f"Invalid output '{as_}'. Must be dict, numpy or pandas"
+            )
+
+    def _subset(self, index):
+        """Return a new GribSet with the messages selected by index.
+
+        index is a slice or an array of positions; cached columns are
+        carried over to the new set.
+        """
+        if isinstance(index, slice):
+            messages = self.messages[index]
+        else:
+            messages = [self.messages[i] for i in index]
+        gribset = self.__class__(messages)
+        for key, column in self._cached_columns().items():
+            if key not in self._unknown:
+                gribset._columns[key] = column[index]
+                continue
+            unknown = self._unknown[key][index]
+            if unknown.all():
+                continue
+            elif unknown.any():
+                gribset._columns[key] = column[index].copy()
+                gribset._unknown[key] = unknown.copy()
+                continue
+            try:
+                gribset._columns[key] = gribtool.query.to_column(
+                    column[index].tolist(), key
+                )
+            except KeyValueNotFoundError:
+                pass
+        return gribset
+
+    def _rows(self, keys):
+        """Return the values of keys for each message as tuples"""
+        columns = self._read_columns(keys)
+        return list(zip(*(columns[key].tolist() for key in keys)))
+
+    def sort_by(self, *keys, reverse=False):
+        """Return a new GribSet sorted by the values of keys.
+
+        The sort is stable and messages lacking a key go first.
+        """
+        rows = self._rows(keys)
+        order = sorted(
+            range(len(rows)),
+            key=lambda i: tuple((v is not None, v) for v in rows[i]),
+            reverse=reverse,
+        )
+        return self._subset(np.array(order, dtype=int))
+
+    def groupby(self, *keys):
+        """Group the messages by the values of keys.
+
+        Return a dict mapping the values, or tuples of values for more
+        than one key, to GribSets in order of first appearance.
+        """
+        groups = {}
+        for i, row in enumerate(self._rows(keys)):
+            groups.setdefault(row if len(keys) > 1 else row[0], []).append(i)
+        return {
+            value: self._subset(np.array(positions, dtype=int))
+            for value, positions in groups.items()
+        }
+
+    def unique(self, key):
+        """Return the distinct values of key in order of first appearance"""
+        return list(dict.fromkeys(self._column(key).tolist()))
 
     def filter(self, **key_values):
-        messages = []
-        for msg in self.messages:
-            for key, value in key_values.items():
-                if msg[key] != value:
-                    break
-            else:
-                messages.append(msg)
+        """Select the messages matching all the conditions.
 
-        return self.__class__(messages)
+        Conditions are ``key=value`` for equality, ``key=callable`` for a
+        predicate on the value, or ``key__op=value`` with op one of eq,
+        ne, lt, le, gt, ge, in, not_in and between (inclusive), e.g.
+        ``filter(level__in=[850, 925], step__between=(0, 48))``.
+        """
+        conditions = gribtool.query.parse(key_values)
+        cached = [
+            key for key in self._cached_columns() if key not in self._unknown
+        ]
+        plan = gribtool.query.plan(conditions, cached)
+
+        # Each key is read once, and only for the messages that passed
+        # the checks before it. The values read are cached, so a repeated
+        # filter reads nothing.
+        positions = np.arange(len(self))
+        for key, key_conditions in plan:
+            if len(positions) == 0:
+                break
+            if len(positions) == len(self):
+                column = self._column(key)
+            else:
+                column = self._column(key, positions)
+            mask = np.ones(len(positions), dtype=bool)
+            for condition in key_conditions:
+                mask &= condition.evaluate(column)
+            positions = positions[mask]
+        return self._subset(positions)
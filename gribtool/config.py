@@ -1,6 +1,18 @@
 class Config:
     def __init__(self, **kwargs):
-        self.valid_options = ["print_keys", "namespace", "max_rows"]
+        self.valid_options = [
+            "print_keys",
+            "namespace",
+            "max_rows",
+            "index",
+            "index_keys",
+            "index_dir",
+            "lazy",
+            "mmap",
+            "cache_keys",
+            "max_handles",
+            "async_workers",
+        ]
         if "print_keys" in kwargs and "namespace" in kwargs:
             raise ValueError(
                 "print_keys and namespace cannot be provided together"
@@ -22,6 +34,19 @@ class Config:
         else:
             self.print_keys = default_print_keys
         self.max_rows = kwargs.get("max_rows", None)
+        # Persistent sidecar index of message offsets (see gribtool.index)
+        self.index = kwargs.get("index", False)
+        self.index_keys = kwargs.get("index_keys", list(default_print_keys))
+        self.index_dir = kwargs.get("index_dir", None)
+        # Lazy GribSets create eccodes handles only on access
+        self.lazy = kwargs.get("lazy", False)
+        self.mmap = kwargs.get("mmap", False)
+        # Memoize the keys read from each GribMessage
+        self.cache_keys = kwargs.get("cache_keys", False)
+        # Maximum number of handles read from files kept alive at once
+        self.max_handles = kwargs.get("max_handles", None)
+        # Maximum number of concurrent calls of the async API
+        self.async_workers = kwargs.get("async_workers", None)
 
     def update(self, **kwargs):
         for key, value in kwargs.items():
@@ -32,7 +57,15 @@ class Config:
     def __repr__(self):
         return (f"Config(namespace={self.namespace},"
                 f" print_keys={self.print_keys},"
-                f" max_rows={self.max_rows})")
+                f" max_rows={self.max_rows},"
+                f" index={self.index},"
+                f" index_keys={self.index_keys},"
+                f" index_dir={self.index_dir},"
+                f" lazy={self.lazy},"
+                f" mmap={self.mmap},"
+                f" cache_keys={self.cache_keys},"
+                f" max_handles={self.max_handles},"
+                f" async_workers={self.async_workers})")
 
 
 rcParams = Config()
@@ -0,0 +1,233 @@
+"""Statistics of an ensemble accumulated one member at a time.
+
+The members are read one after the other and each field is added to
+running float64 statistics with Welford's algorithm, so memory holds a few
+arrays per output field however many members there are. Member files are
+opened lazily and each field is decoded with a handle released right
+after, so memory does not grow with the size of the member files either.
+Masked points are skipped, so a point is only counted over the members
+where it is valid.
+
+    stats = gt.ensemble_stats("mbr*.grb1", thresholds=[273.15],
+                              workers=8, shortName="t")
+    stats.get("std")
+    stats.to_gribset("mean").save("mean.grb1")
+"""
+
+import glob
+
+import numpy as np
+import numpy.ma as ma
+from gribapi import grib_clone
+
+import gribtool.parallel
+from gribtool.base import GribMessage, GribSet, _decode_into
+
+# Keys identifying the same field in every member
+DEFAULT_KEYS = [
+    "shortName",
+    "typeOfLevel",
+    "level",
+    "dataDate",
+    "dataTime",
+    "stepRange",
+]
+
+STATISTICS = ["mean", "std", "min", "max", "count", "probability"]
+
+
+class _Field:
+    """Running statistics of one field, point by point"""
+
+    def __init__(self, n_points, n_thresholds, template):
+        self.count = np.zeros(n_points, dtype=np.int64)
+        self.mean = np.zeros(n_points)
+        self.m2 = np.zeros(n_points)
+        self.min = np.full(n_points, np.inf)
+        self.max = np.full(n_points, -np.inf)
+        self.exceed = np.zeros((n_thresholds, n_points), dtype=np.int64)
+        # Where the first member's message can be rebuilt from
+        self.template = template
+
+    def update(self, values, mask, thresholds):
+        if values.shape != self.mean.shape:
+            raise ValueError(
+                f"Expected {self.mean.size} points, got {values.size}"
+            )
+        if mask is None or not mask.any():
+            self.count += 1
+            delta = values - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (values - self.mean)
+            np.minimum(self.min, values, out=self.min)
+            np.maximum(self.max, values, out=self.max)
+            for exceed, threshold in zip(self.exceed, thresholds):
+                exceed += values > threshold
+            return
+        valid = ~mask
+        self.count += valid
+        delta = np.where(valid, values - self.mean, 0.0)
+        self.mean += delta / np.maximum(self.count, 1)
+        self.m2 += delta * np.where(valid, values - self.mean, 0.0)
+        np.minimum(self.min, values, out=self.min, where=valid)
+        np.maximum(self.max, values, out=self.max, where=valid)
+        for exceed, threshold in zip(self.exceed, thresholds):
+            exceed += valid & (values > threshold)
+
+
+class EnsembleStats:
+    """Mean, spread, extremes and exceedance probabilities of fields.
+
+    Fields are identified by the values of keys, which must be unique
+    within a member. Statistics are added member by member with
+    add_member and read with get or as GRIB messages with to_gribset.
+    """
+
+    def __init__(self, keys=None, thresholds=()):
+        self.keys = list(keys) if keys is not None else list(DEFAULT_KEYS)
+        self.thresholds = list(thresholds)
+        self.n_members = 0
+        self._fields = {}
+
+    @property
+    def fields(self):
+        """The key values of each field, in order of first appearance"""
+        return list(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def add_member(self, gribset, workers=None):
+        """Add the messages of one member to the statistics.
+
+        With workers, fields are decoded and accumulated in parallel by
+        a pool of threads, each field by a single thread. The handles of
+        lazy messages are only kept while their field is decoded.
+        """
+        rows = gribset._rows(self.keys)
+        if len(set(rows)) != len(rows):
+            raise ValueError(f"Fields are not unique by keys {self.keys}")
+        n_points = gribset._column("numberOfDataPoints")
+        has_missing = gribset._has_missing()
+        missing = gribset._column("missingValue")
+        messages = gribset.messages
+        for i, row in enumerate(rows):
+            if row not in self._fields:
+                self._fields[row] = _Field(
+                    int(n_points[i]),
+                    len(self.thresholds),
+                    messages[i]._state(),
+                )
+
+        def accumulate(chunk):
+            values = None
+            for i in chunk:
+                if values is None or values.size != n_points[i]:
+                    values = np.empty(int(n_points[i]))
+                with messages[i]._borrowed():
+                    with messages[i]._pinned() as gid:
+                        _decode_into(gid, values)
+                mask = values == missing[i] if has_missing[i] else None
+                self._fields[rows[i]].update(values, mask, self.thresholds)
+
+        if workers is None or workers <= 1:
+            accumulate(range(len(messages)))
+        else:
+            with gribtool.parallel.get_executor("thread", workers) as pool:
+                chunks = gribtool.parallel.split(len(messages), workers)
+                list(pool.map(accumulate, chunks))
+        self.n_members += 1
+
+    def _get(self, acc, stat, threshold, ddof):
+        if stat == "mean":
+            data = acc.mean.copy()
+        elif stat == "std":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                data = np.sqrt(acc.m2 / (acc.count - ddof))
+        elif stat == "min":
+            data = acc.min.copy()
+        elif stat == "max":
+            data = acc.max.copy()
+        elif stat == "count":
+            return acc.count.copy()
+        elif stat == "probability":
+            if threshold not in self.thresholds:
+                raise ValueError(
+                    f"Threshold {threshold} not in {self.thresholds}"
+                )
+            exceed = acc.exceed[self.thresholds.index(threshold)]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                data = exceed / acc.count
+        else:
+            raise ValueError(
+                f"Invalid statistic '{stat}'. Must be one of {STATISTICS}"
+            )
+        min_count = ddof if stat == "std" else 0
+        return ma.MaskedArray(data, mask=acc.count <= min_count)
+
+    def get(self, stat, field=None, threshold=None, ddof=0):
+        """Return a statistic as a masked array.
+
+        stat is one of mean, std (the spread, with ddof delta degrees of
+        freedom), min, max, count, or probability of exceeding threshold.
+        Points without valid members are masked. Without field, the
+        statistic of all fields is returned as a (n_fields, n_points)
+        array.
+        """
+        if field is not None:
+            return self._get(self._fields[field], stat, threshold, ddof)
+        return ma.stack(
+            [
+                self._get(acc, stat, threshold, ddof)
+                for acc in self._fields.values()
+            ]
+        )
+
+    def to_gribset(self, stat, threshold=None, ddof=0, **key_values):
+        """Return a statistic of each field as new GRIB messages.
+
+        Each message is cloned from the first member's message of the
+        field, its keys are set to key_values, e.g. ``type="em"``, and its
+        values to the statistic.
+        """
+        readers = {}
+        messages = []
+        for field, acc in self._fields.items():
+            template = GribMessage._from_state(acc.template, readers)
+            try:
+                with template._pinned() as gid:
+                    msg = GribMessage._from_gid(grib_clone(gid))
+            finally:
+                template.release()
+            for key, value in key_values.items():
+                msg[key] = value
+            msg.set_values(self._get(acc, stat, threshold, ddof))
+            messages.append(msg)
+        return GribSet(messages)
+
+    def __repr__(self):
+        return (
+            f"<EnsembleStats of {len(self)} fields"
+            f" over {self.n_members} members>"
+        )
+
+
+def ensemble_stats(members, keys=None, thresholds=(), workers=None,
+                   **conditions):
+    """Accumulate statistics of the fields over member files.
+
+    members is a list of files or a glob pattern, read one at a time as
+    lazy GribSets. Only the messages matching conditions, as accepted by
+    GribSet.filter, are used. See EnsembleStats.
+    """
+    if isinstance(members, str):
+        members = sorted(glob.glob(members))
+    stats = EnsembleStats(keys, thresholds)
+    for filename in members:
+        with GribSet(filename, lazy=True) as gribset:
+            if conditions:
+                with gribset.filter(**conditions) as subset:
+                    stats.add_member(subset, workers)
+            else:
+                stats.add_member(gribset, workers)
+    return stats
@@ -0,0 +1,108 @@
+"""Coordinates of the grids of GRIB messages, computed once per grid.
+
+Messages on the same grid share one Geometry, found by the values of the
+keys defining the grid. Its latitudes, longitudes and the points within
+bounding boxes are computed on first use and kept read-only, so they can
+be shared by all messages and threads.
+
+Bounding boxes are given as (north, west, south, east) in degrees, as the
+area of MARS requests. west may be greater than east for boxes crossing
+the antimeridian of the grid.
+"""
+
+import threading
+
+import numpy as np
+from gribapi import grib_get_double_array
+
+# Keys defining regular grids
+GRID_KEYS = [
+    "gridType",
+    "Ni",
+    "Nj",
+    "latitudeOfFirstGridPointInDegrees",
+    "longitudeOfFirstGridPointInDegrees",
+    "latitudeOfLastGridPointInDegrees",
+    "longitudeOfLastGridPointInDegrees",
+    "iDirectionIncrementInDegrees",
+    "jDirectionIncrementInDegrees",
+    "iScansNegatively",
+    "jScansPositively",
+    "jPointsAreConsecutive",
+]
+
+# Grids fully defined by GRID_KEYS, others are also told apart by the
+# checksum of their grid section
+REGULAR_GRIDS = ["regular_ll", "regular_gg"]
+
+_lock = threading.Lock()
+_geometries = {}
+
+
+def grid_keys(grid_types):
+    """Return the keys identifying the grids of the given types."""
+    if all(grid_type in REGULAR_GRIDS for grid_type in grid_types):
+        return GRID_KEYS
+    return GRID_KEYS + ["md5GridSection"]
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+class Geometry:
+    """Latitudes and longitudes of the points of a grid."""
+
+    def __init__(self, key, latitudes, longitudes):
+        self.key = key
+        self.latitudes = _read_only(latitudes)
+        self.longitudes = _read_only(longitudes)
+        self._regions = {}
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def region(self, bbox):
+        """Return the indices of the points within a bounding box."""
+        bbox = tuple(float(value) for value in bbox)
+        indices = self._regions.get(bbox)
+        if indices is not None:
+            return indices
+        north, west, south, east = bbox
+        if north < south:
+            raise ValueError(f"North {north} is south of south {south}")
+        inside = (self.latitudes <= north) & (self.latitudes >= south)
+        width = (east - west) % 360
+        if east - west < 360:
+            inside &= (self.longitudes - west) % 360 <= width
+        indices = _read_only(np.flatnonzero(inside))
+        with _lock:
+            return self._regions.setdefault(bbox, indices)
+
+    def __repr__(self):
+        return f"<Geometry of a {self.key[0]} grid of {len(self)} points>"
+
+
+def get_cached(key):
+    """Return the geometry of the grid with key, if already computed."""
+    return _geometries.get(key)
+
+
+def from_handle(key, gid):
+    """Return the geometry of the grid with key, computed from a handle."""
+    geometry = _geometries.get(key)
+    if geometry is not None:
+        return geometry
+    geometry = Geometry(
+        key,
+        grib_get_double_array(gid, "latitudes"),
+        grib_get_double_array(gid, "longitudes"),
+    )
+    with _lock:
+        return _geometries.setdefault(key, geometry)
+
+
+def clear_cache():
+    with _lock:
+        _geometries.clear()
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import logging
+import os
+
+from gribapi import (
+    grib_get,
+    grib_get_message_offset,
+    grib_new_from_file,
+    grib_release,
+)
+from gribapi.errors import KeyValueNotFoundError
+
+import gribtool.config
+import gribtool.scanner
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".gtidx"
+INDEX_VERSION = 1
+
+
+def index_path(filename):
+    """Return the path of the sidecar index of a GRIB file.
+
+    By default the index lives next to the file. If rcParams.index_dir is
+    set, all indexes are stored there under a name derived from the
+    absolute path of the file, so read-only archives can be indexed too.
+    """
+    index_dir = gribtool.config.rcParams.index_dir
+    if index_dir is None:
+        return filename + INDEX_SUFFIX
+    abspath = os.path.abspath(filename)
+    digest = hashlib.sha1(abspath.encode()).hexdigest()[:16]
+    name = f"{os.path.basename(filename)}.{digest}{INDEX_SUFFIX}"
+    return os.path.join(index_dir, name)
+
+
+def _get_keys(gid, keys):
+    """Return the values of keys in a handle, None for missing keys"""
+    values = {}
+    for key in keys:
+        try:
+            values[key] = grib_get(gid, key)
+        except KeyValueNotFoundError:
+            values[key] = None
+    return values
+
+
+def _matches(headers, conditions):
+    return all(
+        condition.matches(headers[condition.key]) for condition in conditions
+    )
+
+
+class FileIndex:
+    """Byte offsets, lengths and header keys of the messages in a file.
+
+    The index is keyed by the path, size and modification time of the
+    file, so that a stale index is detected and rebuilt automatically.
+    An index just built also holds in scanned the values of the scanned
+    keys known for each message, which are not saved.
+    """
+
+    def __init__(self, filename, size, mtime_ns, keys, offsets, lengths,
+                 values):
+        self.filename = filename
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.keys = list(keys)
+        self.offsets = offsets
+        self.lengths = lengths
+        self.values = values
+        self.scanned = {}
+
+    @classmethod
+    def build(cls, filename, keys=None, conditions=None):
+        """Scan a GRIB file and index its messages.
+
+        Messages are located and the keys in gribtool.scanner.SCANNED_KEYS
+        are decoded from their bytes, so eccodes handles are only created
+        to read other keys. If conditions (see gribtool.query.parse) are
+        given, only the matching messages are indexed, and handles are
+        only created for those passing the conditions on scanned keys.
+        """
+        if keys is None:
+            keys = gribtool.config.rcParams.index_keys
+        keys = list(keys)
+        conditions = list(conditions or [])
+        stat = os.stat(filename)
+        try:
+            scan = gribtool.scanner.scan(filename)
+        except ValueError as e:
+            logger.debug(f"Cannot scan {filename}, using eccodes: {e}")
+            scan = None
+        if scan is None:
+            offsets, lengths, values = cls._read(filename, keys, conditions)
+        else:
+            offsets, lengths, values = cls._read_scanned(
+                scan, keys, conditions
+            )
+        logger.debug(f"Indexed {len(offsets)} messages in {filename}")
+        index = cls(
+            os.path.abspath(filename),
+            stat.st_size,
+            stat.st_mtime_ns,
+            keys,
+            offsets,
+            lengths,
+            values,
+        )
+        if scan is not None:
+            rows = dict(zip(scan.offsets, range(len(scan))))
+            rows = [rows[offset] for offset in offsets]
+            index.scanned = {
+                key: [column[i] for i in rows]
+                for key, column in scan.values.items()
+                if key not in keys
+            }
+        return index
+
+    @staticmethod
+    def _read(filename, keys, conditions):
+        """Index the messages of a file with an eccodes handle each"""
+        offsets = []
+        lengths = []
+        values = {key: [] for key in keys}
+        condition_keys = [condition.key for condition in conditions]
+        with open(filename, "rb") as f:
+            while True:
+                gid = grib_new_from_file(f, True)
+                if gid is None:
+                    break
+                try:
+                    headers = _get_keys(gid, keys + condition_keys)
+                    if not _matches(headers, conditions):
+                        continue
+                    offsets.append(grib_get_message_offset(gid))
+                    lengths.append(grib_get(gid, "totalLength"))
+                    for key in keys:
+                        values[key].append(headers[key])
+                finally:
+                    grib_release(gid)
+        return offsets, lengths, values
+
+    @staticmethod
+    def _read_scanned(scan, keys, conditions):
+        """Index the messages of a scan, reading other keys with eccodes"""
+        offsets = []
+        lengths = []
+        values = {key: [] for key in keys}
+        needed = list(
+            dict.fromkeys(keys + [condition.key for condition in conditions])
+        )
+        with open(scan.filename, "rb") as f:
+            for i in scan.prefilter(conditions):
+                headers = {
+                    key: scan.values[key][i]
+                    for key in needed
+                    if key in scan.values
+                    and scan.values[key][i] is not gribtool.scanner.UNKNOWN
+                }
+                missing = [key for key in needed if key not in headers]
+                if missing:
+                    f.seek(scan.offsets[i])
+                    gid = grib_new_from_file(f, True)
+                    try:
+                        headers.update(_get_keys(gid, missing))
+                    finally:
+                        grib_release(gid)
+                if not _matches(headers, conditions):
+                    continue
+                offsets.append(scan.offsets[i])
+                lengths.append(scan.lengths[i])
+                for key in keys:
+                    values[key].append(headers[key])
+        return offsets, lengths, values
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in {path}")
+        return cls(
+            data["filename"],
+            data["size"],
+            data["mtime_ns"],
+            data["keys"],
+            data["offsets"],
+            data["lengths"],
+            data["values"],
+        )
+
+    def save(self, path):
+        data = {
+            "version": INDEX_VERSION,
+            "filename": self.filename,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "keys": self.keys,
+            "offsets": self.offsets,
+            "lengths": self.lengths,
+            "values": self.values,
+        }
+        # Write to a temporary file and rename it so that concurrent jobs
+        # never read a half-written index
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, filename, keys=None):
+        """Return the index of a file, building it if missing or stale."""
+        if keys is None:
+            keys = gribtool.config.rcParams.index_keys
+        path = index_path(filename)
+        try:
+            index = cls.load(path)
+        except (OSError, ValueError, KeyError):
+            index = None
+        if index is not None and index.is_valid(filename, keys):
+            logger.debug(f"Using index {path}")
+            return index
+
+        index = cls.build(filename, keys)
+        try:
+            index.save(path)
+        except OSError as e:
+            logger.warning(f"Could not write index {path}: {e}")
+        return index
+
+    def is_valid(self, filename, keys=()):
+        """Check that the index matches the file and covers the keys."""
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+        return (
+            os.path.abspath(self.filename) == os.path.abspath(filename)
+            and self.size == stat.st_size
+            and self.mtime_ns == stat.st_mtime_ns
+            and all(key in self.values for key in keys)
+        )
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __repr__(self):
+        return f"<FileIndex of {self.filename} with {len(self)} messages>"
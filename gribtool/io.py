@@ -0,0 +1,254 @@
+import logging
+import mmap
+import os
+import threading
+
+import numpy as np
+from gribapi import grib_new_from_message
+
+import gribtool.config
+import gribtool.query
+from gribtool.index import FileIndex
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks used when the kernel cannot copy between files
+BUFFER_SIZE = 1 << 20
+
+# Bytes gathered before each vectored write
+BATCH_SIZE = 64 << 20
+
+
+class FileReader:
+    """Random access to the messages of a GRIB file by byte offset.
+
+    Without mmap every read opens the file and reads the message with a
+    positional read, so no file descriptor is held between accesses. With
+    mmap the file is mapped on first access and messages are handed to
+    eccodes straight from the mapping.
+    """
+
+    def __init__(self, filename, use_mmap=False):
+        self.filename = filename
+        self.use_mmap = use_mmap
+        self._mmap = None
+        self._lock = threading.Lock()
+        self._signature = self._get_signature()
+
+    def _get_signature(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_unchanged(self):
+        """Check that the file was not modified since it was opened"""
+        return self._get_signature() == self._signature
+
+    def _get_mmap(self):
+        with self._lock:
+            if self._mmap is None:
+                with open(self.filename, "rb") as f:
+                    self._mmap = mmap.mmap(
+                        f.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+            return self._mmap
+
+    def read(self, offset, length):
+        """Return the bytes of the message at offset."""
+        if self.use_mmap:
+            return self._get_mmap()[offset:offset + length]
+        fd = os.open(self.filename, os.O_RDONLY)
+        try:
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+    def read_many(self, ranges):
+        """Yield the bytes of each (offset, length) range.
+
+        Ranges that follow each other are read together, up to BATCH_SIZE
+        bytes, through a single file descriptor, and the bytes of each
+        range are yielded as a view of what was read.
+        """
+        ranges = list(ranges)
+        if self.use_mmap:
+            mm = self._get_mmap()
+            for offset, length in ranges:
+                yield mm[offset:offset + length]
+            return
+        fd = os.open(self.filename, os.O_RDONLY)
+        try:
+            start = 0
+            for offset, length in _merge_ranges(ranges, BATCH_SIZE):
+                data = os.pread(fd, length, offset)
+                if len(data) < length:
+                    raise EOFError(f"Unexpected end of file {self.filename}")
+                view = memoryview(data)
+                position = 0
+                while position < length:
+                    size = ranges[start][1]
+                    yield view[position:position + size]
+                    position += size
+                    start += 1
+        finally:
+            os.close(fd)
+
+    def new_handle(self, offset, length):
+        """Create an eccodes handle for the message at offset."""
+        if not self.is_unchanged():
+            raise OSError(f"{self.filename} changed since it was opened")
+        if self.use_mmap:
+            # eccodes copies the message, so the view is released right away
+            with memoryview(self._get_mmap()) as buffer:
+                with buffer[offset:offset + length] as view:
+                    return grib_new_from_message(view)
+        return grib_new_from_message(self.read(offset, length))
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+
+    def __repr__(self):
+        return f"<FileReader of {self.filename}>"
+
+
+def _writev(fd, buffers):
+    """Write all buffers to fd, resuming after partial writes"""
+    views = [memoryview(buffer) for buffer in buffers]
+    start = 0
+    while start < len(views):
+        written = os.writev(fd, views[start:])
+        while start < len(views) and written >= len(views[start]):
+            written -= len(views[start])
+            start += 1
+        if written:
+            views[start] = views[start][written:]
+
+
+def write_buffers(f, buffers):
+    """Write an iterable of byte buffers to a file with few system calls.
+
+    Buffers are gathered in batches of up to BATCH_SIZE bytes written
+    with os.writev where available, else with a single buffered stream.
+    """
+    if not hasattr(os, "writev"):
+        for buffer in buffers:
+            f.write(buffer)
+        return
+    f.flush()
+    fd = f.fileno()
+    try:
+        max_buffers = os.sysconf("SC_IOV_MAX")
+    except (ValueError, OSError):
+        max_buffers = 1024
+    batch = []
+    size = 0
+    for buffer in buffers:
+        batch.append(buffer)
+        size += len(buffer)
+        if size >= BATCH_SIZE or len(batch) >= max_buffers:
+            _writev(fd, batch)
+            batch = []
+            size = 0
+    if batch:
+        _writev(fd, batch)
+
+
+def _merge_ranges(ranges, max_length=None):
+    """Merge (offset, length) ranges that follow each other.
+
+    With max_length, ranges are not merged beyond that many bytes.
+    """
+    merged = []
+    for offset, length in ranges:
+        if (
+            merged
+            and merged[-1][0] + merged[-1][1] == offset
+            and (max_length is None or merged[-1][1] + length <= max_length)
+        ):
+            merged[-1][1] += length
+        else:
+            merged.append([offset, length])
+    return merged
+
+
+def _copy_range(fin, fout, offset, length):
+    """Copy length bytes at offset of fin to the current position of fout.
+
+    The copy is done in the kernel with os.copy_file_range when possible,
+    falling back to buffered reads and writes.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while length > 0:
+                n = os.copy_file_range(
+                    fin.fileno(), fout.fileno(), length, offset
+                )
+                if n == 0:
+                    break
+                offset += n
+                length -= n
+        except OSError:
+            # e.g. not supported by the file system
+            pass
+    while length > 0:
+        chunk = os.pread(fin.fileno(), min(length, BUFFER_SIZE), offset)
+        if not chunk:
+            raise EOFError(f"Unexpected end of file {fin.name}")
+        fout.write(chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+
+
+def copy_ranges(source, destination, ranges, append=False):
+    """Copy (offset, length) byte ranges of source into destination.
+
+    Raise ValueError if destination is source, which would be emptied
+    before it is read, or grow while read if appending.
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        raise ValueError(f"Cannot copy {source} into itself")
+    mode = "ab" if append else "wb"
+    with open(source, "rb") as fin:
+        with open(destination, mode, buffering=0) as fout:
+            for offset, length in _merge_ranges(ranges):
+                _copy_range(fin, fout, offset, length)
+
+
+def copy(source, destination, append=False, **conditions):
+    """Copy the messages of a file matching conditions without decoding.
+
+    Messages are selected from their headers only, with the conditions
+    accepted by GribSet.filter, and their original bytes are copied to
+    destination. The index of source is used if rcParams.index is set.
+    Return the number of messages copied.
+    """
+    conditions = gribtool.query.parse(conditions)
+    keys = list(dict.fromkeys(condition.key for condition in conditions))
+    if gribtool.config.rcParams.index:
+        keys = list(
+            dict.fromkeys(gribtool.config.rcParams.index_keys + keys)
+        )
+        index = FileIndex.open(source, keys)
+    else:
+        # Only messages passing the conditions are read with eccodes
+        index = FileIndex.build(source, keys, conditions)
+
+    mask = np.ones(len(index), dtype=bool)
+    for condition in conditions:
+        column = gribtool.query.to_column(
+            index.values[condition.key], condition.key
+        )
+        mask &= condition.evaluate(column)
+    positions = np.flatnonzero(mask)
+    ranges = [(index.offsets[i], index.lengths[i]) for i in positions]
+    copy_ranges(source, destination, ranges, append=append)
+    logger.debug(
+        f"Copied {len(ranges)} of {len(index)} messages"
+        f" from {source} to {destination}"
+    )
+    return len(ranges)
@@ -0,0 +1,63 @@
+"""Helpers to spread eccodes work over a pool of threads or processes.
+
+eccodes releases the GIL while decoding and encoding, so threads scale
+for those calls and share memory with the caller. Processes cannot share
+eccodes handles, so the raw bytes of the messages, or their location in
+their file, are shipped instead.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from gribapi import (
+    grib_get_values,
+    grib_new_from_message,
+    grib_release,
+)
+
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+def get_executor(executor, workers):
+    if executor not in EXECUTORS:
+        raise ValueError(
+            f"Invalid executor '{executor}'. Must be one of {list(EXECUTORS)}"
+        )
+    return EXECUTORS[executor](max_workers=workers)
+
+
+def split(n, workers):
+    """Split range(n) into contiguous chunks, a few per worker."""
+    n_chunks = min(n, 4 * workers)
+    if n_chunks == 0:
+        return []
+    return np.array_split(np.arange(n), n_chunks)
+
+
+def decode_messages(messages, dtype):
+    """Decode the values of raw GRIB messages into a stacked array."""
+    result = None
+    for i, message in enumerate(messages):
+        gid = grib_new_from_message(message)
+        try:
+            values = grib_get_values(gid)
+        finally:
+            grib_release(gid)
+        if result is None:
+            result = np.empty((len(messages), values.size), dtype=dtype)
+        result[i] = values
+    return result
+
+
+def map_messages(func, messages):
+    """Apply func to messages unpickled in a worker process."""
+    results = [func(msg) for msg in messages]
+    returned = {id(result) for result in results}
+    for msg in messages:
+        # Messages returned by func are pickled back to the caller
+        if id(msg) not in returned:
+            msg.release()
+    return results
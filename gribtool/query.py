@@ -0,0 +1,156 @@
+"""Conditions accepted by GribSet.filter and the order they are run in.
+
+A condition is given as a keyword argument ``key__operator=value``, e.g.
+``level__in=[850, 925]``, ``step__between=(0, 48)`` or
+``shortName__ne="t"``. A bare ``key=value`` tests equality, and a
+callable value is used as a predicate on the value of the key.
+"""
+
+import operator
+
+import numpy as np
+from gribapi.errors import KeyValueNotFoundError
+
+SEPARATOR = "__"
+
+COMPARISONS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+}
+
+# Rough rank of how selective each operator is, most selective first
+RANKS = {
+    "eq": 0,
+    "in": 1,
+    "between": 2,
+    "lt": 3,
+    "le": 3,
+    "gt": 3,
+    "ge": 3,
+    "not_in": 4,
+    "ne": 4,
+    "call": 5,
+}
+
+
+def to_column(values, key):
+    """Convert the values of a key to a NumPy array of their type."""
+    types = {type(value) for value in values}
+    if types == {type(None)} and len(values) > 0:
+        raise KeyValueNotFoundError(f"Key '{key}' not found in GRIB message")
+    if len(types) == 1:
+        return np.array(values)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _elementwise(column, func):
+    """Apply func to each value of the column, None never matches."""
+    return np.fromiter(
+        (value is not None and bool(func(value)) for value in column),
+        dtype=bool,
+        count=len(column),
+    )
+
+
+def _compare(column, op, value):
+    func = COMPARISONS[op]
+    if column.dtype == object:
+        if op == "ne":
+            return ~_elementwise(column, lambda item: item == value)
+        return _elementwise(column, lambda item: func(item, value))
+    result = func(column, value)
+    if np.ndim(result) == 0:
+        # The types of the column and the value are not comparable
+        result = np.full(len(column), bool(result))
+    return result
+
+
+def _isin(column, values):
+    if column.dtype == object:
+        values = set(values)
+        return _elementwise(column, lambda value: value in values)
+    return np.isin(column, list(values))
+
+
+class Condition:
+    def __init__(self, key, op, value):
+        if op not in RANKS:
+            raise ValueError(
+                f"Invalid operator '{op}'. Must be one of {list(RANKS)}"
+            )
+        if op == "between" and len(value) != 2:
+            raise ValueError("between requires a (low, high) pair")
+        self.key = key
+        self.op = op
+        self.value = value
+
+    @classmethod
+    def parse(cls, name, value):
+        """Create a condition from a filter keyword argument."""
+        key, sep, op = name.rpartition(SEPARATOR)
+        if not sep or op not in RANKS:
+            key, op = name, "eq"
+        if callable(value):
+            if op != "eq":
+                raise ValueError(
+                    f"Predicate for '{key}' cannot be combined with '{op}'"
+                )
+            op = "call"
+        return cls(key, op, value)
+
+    @property
+    def rank(self):
+        return RANKS[self.op]
+
+    def evaluate(self, column):
+        """Return a boolean mask of the values of the column that match"""
+        if self.op in COMPARISONS:
+            return _compare(column, self.op, self.value)
+        elif self.op == "in":
+            return _isin(column, self.value)
+        elif self.op == "not_in":
+            return ~_isin(column, self.value)
+        elif self.op == "between":
+            low, high = self.value
+            return _compare(column, "ge", low) & _compare(column, "le", high)
+        else:
+            return _elementwise(column, self.value)
+
+    def matches(self, value):
+        """Check a single value, None being a missing key"""
+        column = np.empty(1, dtype=object)
+        column[0] = value
+        return bool(self.evaluate(column)[0])
+
+    def __repr__(self):
+        return f"Condition({self.key!r}, {self.op!r}, {self.value!r})"
+
+
+def parse(key_values):
+    return [Condition.parse(name, value) for name, value in key_values.items()]
+
+
+def plan(conditions, cached_keys=()):
+    """Group conditions by key and order the groups by cost.
+
+    Keys already cached go first as they need no eccodes calls, then the
+    most selective operators, so that the keys checked later are read
+    for as few messages as possible. Each key is read once.
+    """
+    groups = {}
+    for condition in conditions:
+        groups.setdefault(condition.key, []).append(condition)
+    order = sorted(
+        groups,
+        key=lambda key: (
+            key not in cached_keys,
+            min(condition.rank for condition in groups[key]),
+        ),
+    )
+    return [(key, groups[key]) for key in order]
@@ -0,0 +1,308 @@
+"""Locate GRIB messages and decode a few header keys without eccodes.
+
+The file is memory-mapped and each message is found from the GRIB marker
+and the total length in its section 0, including the large message
+encoding of GRIB1. A small set of keys is then decoded with NumPy
+straight from the bytes of sections 1 and 4, for all the messages at
+once. Values are those eccodes would return; keys that do not apply to
+a message are None, and keys that cannot be decoded without the eccodes
+tables, e.g. the level of GRIB1 layers, are UNKNOWN.
+
+FileIndex.build uses the scanner, so eccodes handles are only created for
+the keys that are not scanned, and for messages that pass the conditions
+on scanned keys.
+"""
+
+import logging
+import mmap
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Keys decoded by the scanner
+SCANNED_KEYS = [
+    "edition",
+    "dataDate",
+    "dataTime",
+    "level",
+    "step",
+    # GRIB1
+    "table2Version",
+    "indicatorOfParameter",
+    "timeRangeIndicator",
+    "P1",
+    "P2",
+    # GRIB2
+    "discipline",
+    "parameterCategory",
+    "parameterNumber",
+    "forecastTime",
+]
+
+# GRIB1 level types holding the top and bottom of a layer in two octets
+# instead of a single level
+GRIB1_LAYERS = [101, 104, 106, 108, 110, 112, 114, 116, 120, 121, 128, 141]
+
+# GRIB2 product templates sharing the layout of template 4.0 up to the
+# first fixed surface, and those of them without a time interval
+GRIB2_TEMPLATES = [0, 1, 2, 8, 11, 12]
+GRIB2_INSTANT = [0, 1, 2]
+
+# Hours per unit of time range (code table 4 of GRIB1 and 4.4 of GRIB2)
+HOURS = {1: 1, 2: 24}
+
+MISSING_4 = 0xFFFFFFFF
+
+
+class _Unknown:
+    def __repr__(self):
+        return "UNKNOWN"
+
+
+UNKNOWN = _Unknown()
+
+
+def _uint(buf, starts, size):
+    """Big-endian unsigned integers of size bytes at each start"""
+    octets = buf[starts[:, None] + np.arange(size)].astype(np.int64)
+    value = np.zeros(len(starts), dtype=np.int64)
+    for i in range(size):
+        value = (value << 8) | octets[:, i]
+    return value
+
+
+def _grib1_length(mm, offset):
+    length = int.from_bytes(mm[offset + 4:offset + 7], "big")
+    if not length & 0x800000:
+        return length
+    # Large message: the length is in units of 120 bytes, corrected by
+    # the length of section 4 whose real size does not fit in it
+    position = offset + 8
+    flag = mm[position + 7]
+    position += int.from_bytes(mm[position:position + 3], "big")
+    if flag & 0x80:
+        position += int.from_bytes(mm[position:position + 3], "big")
+    if flag & 0x40:
+        position += int.from_bytes(mm[position:position + 3], "big")
+    section4 = int.from_bytes(mm[position:position + 3], "big")
+    if section4 >= 120:
+        return length
+    return (length & 0x7FFFFF) * 120 - section4 + 4
+
+
+def _grib2_sections(mm, offset, length):
+    """Return the offsets of sections 1 and 4 of a GRIB2 message"""
+    position = offset + 16
+    section1 = section4 = None
+    end = offset + length - 4
+    while position + 5 <= end:
+        size = int.from_bytes(mm[position:position + 4], "big")
+        number = mm[position + 4]
+        if number == 1:
+            section1 = position
+        elif number == 4:
+            section4 = position
+            break
+        if size < 5:
+            break
+        position += size
+    if section1 is None or section4 is None:
+        raise ValueError(f"Invalid GRIB2 message at offset {offset}")
+    return section1, section4
+
+
+def _locate(mm):
+    """Return the offset, length and edition of each message"""
+    offsets, lengths, editions = [], [], []
+    position = mm.find(b"GRIB")
+    while position >= 0:
+        if position + 16 > len(mm):
+            raise ValueError(f"Truncated GRIB message at offset {position}")
+        edition = mm[position + 7]
+        if edition == 1:
+            length = _grib1_length(mm, position)
+        elif edition == 2:
+            length = int.from_bytes(mm[position + 8:position + 16], "big")
+        else:
+            raise ValueError(
+                f"Unsupported GRIB edition {edition} at offset {position}"
+            )
+        end = position + length
+        if end > len(mm) or mm[end - 4:end] != b"7777":
+            raise ValueError(f"Invalid GRIB message at offset {position}")
+        offsets.append(position)
+        lengths.append(length)
+        editions.append(edition)
+        position = mm.find(b"GRIB", end)
+    return offsets, lengths, editions
+
+
+def _decode_grib1(buf, starts):
+    """Decode the keys of GRIB1 messages from their section 1"""
+    octet = {n: buf[starts + n - 1].astype(np.int64) for n in range(1, 29)}
+    year = (octet[25] - 1) * 100 + octet[13]
+    layer = np.isin(octet[10], GRIB1_LAYERS)
+    level = octet[11] * 256 + octet[12]
+
+    tri = octet[21]
+    p1, p2 = octet[19], octet[20]
+    hours = np.vectorize(lambda unit: HOURS.get(unit, 0))(octet[18])
+    step = np.where(tri == 10, p1 * 256 + p2, p1) * hours
+    step_known = np.isin(tri, [0, 10]) & (hours > 0)
+
+    return {
+        "edition": (np.full(len(starts), 1), None),
+        "dataDate": (year * 10000 + octet[14] * 100 + octet[15], None),
+        "dataTime": (octet[16] * 100 + octet[17], None),
+        "level": (level, layer),
+        "step": (step, ~step_known),
+        "table2Version": (octet[4], None),
+        "indicatorOfParameter": (octet[9], None),
+        "timeRangeIndicator": (tri, None),
+        "P1": (p1, None),
+        "P2": (p2, None),
+    }
+
+
+def _decode_grib2(buf, offsets, section1, section4):
+    """Decode the keys of GRIB2 messages from sections 0, 1 and 4"""
+    template = _uint(buf, section4 + 7, 2)
+    laid_out = np.isin(template, GRIB2_TEMPLATES)
+    unit = buf[section4 + 17].astype(np.int64)
+    forecast = _uint(buf, section4 + 18, 4)
+    hours = np.vectorize(lambda unit: HOURS.get(unit, 0))(unit)
+    step_known = np.isin(template, GRIB2_INSTANT) & (hours > 0)
+    step_known &= forecast < 0x80000000
+
+    surface = buf[section4 + 22].astype(np.int64)
+    factor = buf[section4 + 23].astype(np.int64)
+    # The scale factor is stored as sign and magnitude
+    factor = np.where(factor & 0x80, -(factor & 0x7F), factor)
+    scaled = _uint(buf, section4 + 24, 4)
+    missing = scaled == MISSING_4
+    with np.errstate(over="ignore", invalid="ignore"):
+        value = scaled * 10.0 ** -factor.astype(float)
+    value = np.where(surface == 100, value / 100, value)
+    level_known = laid_out & (
+        (np.isin(surface, [100, 103, 105]) & ~missing)
+        | (np.isin(surface, [1, 101]) & missing)
+    )
+    level_known &= (value == np.round(value)) | missing
+    level = np.where(missing, 0, np.round(value)).astype(np.int64)
+
+    year = _uint(buf, section1 + 12, 2)
+    return {
+        "edition": (np.full(len(offsets), 2), None),
+        "dataDate": (
+            year * 10000
+            + buf[section1 + 14].astype(np.int64) * 100
+            + buf[section1 + 15],
+            None,
+        ),
+        "dataTime": (
+            buf[section1 + 16].astype(np.int64) * 100 + buf[section1 + 17],
+            None,
+        ),
+        "level": (level, ~level_known),
+        "step": (forecast * hours, ~step_known),
+        "discipline": (buf[offsets + 6].astype(np.int64), None),
+        "parameterCategory": (buf[section4 + 9].astype(np.int64), ~laid_out),
+        "parameterNumber": (buf[section4 + 10].astype(np.int64), ~laid_out),
+        # Derived by eccodes from the product template
+        "timeRangeIndicator": (template, np.ones(len(offsets), dtype=bool)),
+        "forecastTime": (forecast, ~laid_out),
+    }
+
+
+class Scan:
+    """Offsets, lengths and scanned keys of the messages in a file."""
+
+    def __init__(self, filename, offsets, lengths, values):
+        self.filename = filename
+        self.offsets = offsets
+        self.lengths = lengths
+        self.values = values
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def prefilter(self, conditions):
+        """Return the positions of the messages that may match conditions.
+
+        Only conditions on scanned keys are checked, and messages whose
+        value is UNKNOWN are kept.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        for condition in conditions:
+            if condition.key not in self.values:
+                continue
+            values = self.values[condition.key]
+            known = np.array([value is not UNKNOWN for value in values],
+                             dtype=bool)
+            column = np.empty(int(known.sum()), dtype=object)
+            column[:] = [value for value in values if value is not UNKNOWN]
+            keep[known] &= condition.evaluate(column)
+        return np.flatnonzero(keep)
+
+    def __repr__(self):
+        return f"<Scan of {self.filename} with {len(self)} messages>"
+
+
+def scan(filename):
+    """Locate the messages of a GRIB file and decode SCANNED_KEYS.
+
+    Raise ValueError if the file holds an invalid or unsupported message.
+    """
+    if os.path.getsize(filename) == 0:
+        return Scan(filename, [], [], {key: [] for key in SCANNED_KEYS})
+    with open(filename, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = None
+    try:
+        offsets, lengths, editions = _locate(mm)
+        values = {key: [None] * len(offsets) for key in SCANNED_KEYS}
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        editions = np.array(editions, dtype=np.int64)
+        starts = np.array(offsets, dtype=np.int64)
+
+        decoded = []
+        grib1 = np.flatnonzero(editions == 1)
+        if len(grib1):
+            decoded.append((grib1, _decode_grib1(buf, starts[grib1] + 8)))
+        grib2 = np.flatnonzero(editions == 2)
+        if len(grib2):
+            sections = np.array(
+                [
+                    _grib2_sections(mm, offsets[i], lengths[i])
+                    for i in grib2
+                ],
+                dtype=np.int64,
+            )
+            decoded.append(
+                (
+                    grib2,
+                    _decode_grib2(
+                        buf, starts[grib2], sections[:, 0], sections[:, 1]
+                    ),
+                )
+            )
+        for positions, columns in decoded:
+            for key, (column, unknown) in columns.items():
+                column = column.tolist()
+                if unknown is not None:
+                    for i in np.flatnonzero(unknown):
+                        column[i] = UNKNOWN
+                for i, value in zip(positions, column):
+                    values[key][i] = value
+    finally:
+        buf = None
+        try:
+            mm.close()
+        except BufferError:
+            # Still exported by the traceback of an error, the mapping is
+            # closed when it is garbage collected
+            pass
+    logger.debug(f"Scanned {len(offsets)} messages in {filename}")
+    return Scan(filename, offsets, lengths, values)
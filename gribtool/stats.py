@@ -0,0 +1,217 @@
+"""Opt-in profiling of the eccodes calls and hot paths of gribtool.
+
+While enabled, the gribapi functions imported by the gribtool modules and
+a few GribSet methods are replaced by wrappers that count and time each
+call. Nothing is wrapped while disabled, so there is no overhead. The
+values of a GribSet are decoded by _decode_into, timed as a hot path, in
+place of grib_get_values.
+
+    with gribtool.stats.profile():
+        with gt.GribSet(filename) as my_grib:
+            my_grib.filter(shortName="t").get_values()
+    print(gribtool.stats.summary())
+    gribtool.stats.save_trace("trace.json")
+
+The trace is in the Chrome trace event format, which can be opened with
+chrome://tracing, Perfetto or speedscope. Times are inclusive, e.g. the
+time of GribSet.filter includes that of the grib_get calls it makes.
+"""
+
+import functools
+import importlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import gribapi
+
+# Modules whose gribapi functions are wrapped
+MODULES = [
+    "gribtool.base",
+    "gribtool.ensemble",
+    "gribtool.geometry",
+    "gribtool.index",
+    "gribtool.io",
+    "gribtool.parallel",
+    "gribtool.streaming",
+]
+
+# Other functions and methods timed, by module and qualified name
+HOT_PATHS = {
+    "gribtool.base": [
+        "_decode_into",
+        "GribSet.__init__",
+        "GribSet.filter",
+        "GribSet.get_values",
+        "GribSet.save",
+        "GribSet.release",
+        "GribSet.open_many",
+    ],
+}
+
+_lock = threading.Lock()
+_calls = {}
+_events = []
+_originals = []
+_depth = 0
+_start = time.perf_counter_ns()
+
+
+def _record(name, start, end, args=None):
+    with _lock:
+        count = _calls.setdefault(name, [0, 0])
+        count[0] += 1
+        count[1] += end - start
+        event = {
+            "name": name,
+            "cat": name.partition(".")[0],
+            "ph": "X",
+            "ts": (start - _start) / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        _events.append(event)
+
+
+def _wrap(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(name, start, time.perf_counter_ns())
+
+    return wrapper
+
+
+def _wrap_method(name, func):
+    """Time a GribSet method, recording which set and its size"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        size = len(getattr(self, "messages", ()))
+        start = time.perf_counter_ns()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            end = time.perf_counter_ns()
+            # The size before a release, or after loading
+            size = max(size, len(getattr(self, "messages", ())))
+            details = {"gribset": id(self), "messages": size}
+            _record(name, start, end, details)
+
+    return wrapper
+
+
+def _patch(owner, attr, wrapper):
+    _originals.append((owner, attr, owner.__dict__[attr]))
+    setattr(owner, attr, wrapper)
+
+
+def enable():
+    """Start counting and timing calls."""
+    global _depth
+    with _lock:
+        _depth += 1
+        if _depth > 1:
+            return
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        for name, value in list(vars(module).items()):
+            if (
+                name.startswith("grib_")
+                and getattr(gribapi, name, None) is value
+            ):
+                _patch(module, name, _wrap(name, value))
+    for module_name, names in HOT_PATHS.items():
+        module = importlib.import_module(module_name)
+        for name in names:
+            owner_name, _, attr = name.rpartition(".")
+            if not owner_name:
+                _patch(module, attr, _wrap(name, getattr(module, attr)))
+                continue
+            owner = getattr(module, owner_name)
+            value = owner.__dict__[attr]
+            if isinstance(value, classmethod):
+                wrapper = classmethod(_wrap(name, value.__func__))
+            else:
+                wrapper = _wrap_method(name, value)
+            _patch(owner, attr, wrapper)
+
+
+def disable():
+    """Stop counting calls and restore the original functions."""
+    global _depth
+    with _lock:
+        if _depth == 0:
+            return
+        _depth -= 1
+        if _depth > 0:
+            return
+    while _originals:
+        owner, attr, value = _originals.pop()
+        setattr(owner, attr, value)
+
+
+def is_enabled():
+    return _depth > 0
+
+
+def reset():
+    """Forget the calls recorded so far."""
+    global _start
+    with _lock:
+        _calls.clear()
+        _events.clear()
+        _start = time.perf_counter_ns()
+
+
+@contextmanager
+def profile(reset_stats=True):
+    """Record calls within the context, forgetting earlier ones."""
+    if reset_stats:
+        reset()
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def get_stats():
+    """Return a dict of name: (number of calls, total seconds)."""
+    with _lock:
+        return {
+            name: (count, total / 1e9)
+            for name, (count, total) in _calls.items()
+        }
+
+
+def summary():
+    """Return a table of the recorded calls, the slowest first."""
+    stats = sorted(
+        get_stats().items(), key=lambda item: item[1][1], reverse=True
+    )
+    width = max([len(name) for name, _ in stats] + [4])
+    lines = [
+        f"{'name':<{width}}  {'calls':>8}  {'total ms':>10}  {'mean us':>10}"
+    ]
+    for name, (count, total) in stats:
+        lines.append(
+            f"{name:<{width}}  {count:>8}  {1e3 * total:>10.3f}"
+            f"  {1e6 * total / count:>10.3f}"
+        )
+    return "\n".join(lines)
+
+
+def save_trace(filename):
+    """Write the recorded calls as a Chrome trace event JSON file."""
+    with _lock:
+        events = list(_events)
+    with open(filename, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,108 @@
+import logging
+import queue
+import threading
+
+from gribapi import grib_new_from_file, grib_release
+from gribapi.errors import KeyValueNotFoundError
+
+import gribtool.query
+from gribtool.base import GribMessage
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the file in the prefetch queue
+_END = object()
+
+
+def _read(f, headers_only):
+    while True:
+        gid = grib_new_from_file(f, headers_only)
+        if gid is None:
+            return
+        yield gid
+
+
+def _prefetch(f, headers_only, n):
+    """Read handles in a background thread, up to n ahead of the consumer"""
+    handles = queue.Queue(maxsize=n)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up if the consumer stopped while the queue is full
+        while not stop.is_set():
+            try:
+                handles.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for gid in _read(f, headers_only):
+                if not put(gid):
+                    grib_release(gid)
+                    return
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = handles.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+        # Release the handles read ahead that were never consumed
+        while not handles.empty():
+            item = handles.get()
+            if isinstance(item, int):
+                grib_release(item)
+
+
+def _get(msg, key):
+    try:
+        return msg[key]
+    except KeyValueNotFoundError:
+        return None
+
+
+def stream(filename, keys=None, filter=None, headers_only=False,
+           prefetch=0):
+    """Iterate over the messages of a file holding one handle at a time.
+
+    Each GribMessage is released as soon as the consumer asks for the
+    next one, so clone it to keep it. If keys is given, a dict with the
+    values of those keys is yielded instead of the message. filter is a
+    dict of conditions as accepted by GribSet.filter. With prefetch, up to
+    that many messages are read ahead in a background thread.
+    """
+    conditions = gribtool.query.parse(filter or {})
+    with open(filename, "rb") as f:
+        if prefetch:
+            gids = _prefetch(f, headers_only, prefetch)
+        else:
+            gids = _read(f, headers_only)
+        try:
+            for gid in gids:
+                msg = GribMessage._from_gid(gid)
+                try:
+                    if all(
+                        condition.matches(_get(msg, condition.key))
+                        for condition in conditions
+                    ):
+                        if keys is None:
+                            yield msg
+                        else:
+                            yield {key: _get(msg, key) for key in keys}
+                finally:
+                    msg.release()
+        finally:
+            gids.close()
@@ -1,6 +1,42 @@
+import numpy as np
 import pytest
+from gribapi import (
+    grib_get,
+    grib_new_from_samples,
+    grib_release,
+    grib_set,
+    grib_set_values,
+    grib_write,
+)
 
 
 @pytest.fixture
 def grib_name():
     return "./tests/mbr001_fc2024061800+024.grb1"
+
+
+@pytest.fixture
+def write_grib2(tmp_path):
+    """Return a function writing GRIB2 messages with a packing type.
+
+    Each message gets smooth values offset by its position, the first
+    n_missing points being missing, which complex packing flags with its
+    missing value management instead of a bitmap.
+    """
+    def write(name, packing_type, n_messages=1, n_missing=0):
+        filename = str(tmp_path / name)
+        with open(filename, "wb") as f:
+            for k in range(n_messages):
+                gid = grib_new_from_samples("GRIB2")
+                grib_set(gid, "packingType", packing_type)
+                n_points = grib_get(gid, "numberOfDataPoints")
+                values = np.linspace(200.0, 300.0, n_points) + k
+                if n_missing:
+                    grib_set(gid, "missingValueManagementUsed", 1)
+                    values[:n_missing] = grib_get(gid, "missingValue")
+                grib_set_values(gid, values)
+                grib_write(gid, f)
+                grib_release(gid)
+        return filename
+
+    return write
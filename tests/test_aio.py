@@ -0,0 +1,56 @@
+import asyncio
+import logging
+
+import numpy.ma as ma
+import pytest
+
+import gribtool as gt
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def async_workers():
+    gt.config.set_config(async_workers=2)
+    yield 2
+    gt.config.set_config(async_workers=None)
+
+
+def test_aopen_many(grib_name, async_workers):
+    async def main():
+        return await asyncio.gather(
+            *(gt.GribSet.aopen(grib_name, lazy=True) for _ in range(4))
+        )
+
+    gribsets = asyncio.run(main())
+    assert [len(gribset) for gribset in gribsets] == [362] * 4
+    for gribset in gribsets:
+        gribset.release()
+
+
+def test_aiter_aget_values(grib_name):
+    async def main():
+        with await gt.GribSet.aopen(grib_name, lazy=True) as my_grib:
+            subset = my_grib[:5]
+            levels = [msg["level"] async for msg in subset.aiter()]
+            values = await subset[0].aget_values()
+            cube = await subset.aget_values(workers=2)
+            assert levels == subset[:, "level"]
+            assert ma.allequal(values, cube[0])
+            subset.release()
+
+    asyncio.run(main())
+
+
+def test_asave(grib_name, tmp_path):
+    filename = str(tmp_path / "saved.grb")
+
+    async def main():
+        with await gt.GribSet.aopen(grib_name) as my_grib:
+            subset = my_grib.filter(shortName="t")
+            await subset.asave(filename)
+            return len(subset)
+
+    n = asyncio.run(main())
+    with gt.GribSet(filename) as saved:
+        assert len(saved) == n
@@ -0,0 +1,93 @@
+import logging
+
+import numpy as np
+import numpy.ma as ma
+import pytest
+
+import gribtool as gt
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def members(grib_name, tmp_path):
+    """Three members with perturbed temperatures, one partly masked"""
+    paths = []
+    fields = []
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib.filter(shortName="t", level__in=[850, 500])
+        original = subset.get_values()
+        for k, offset in enumerate([-1.0, 0.5, 3.0]):
+            values = ma.MaskedArray(original + offset)
+            if k == 1:
+                values[:, :100] = ma.masked
+            subset.set_values(values)
+            path = str(tmp_path / f"mbr{k:03d}.grb1")
+            subset.save(path)
+            paths.append(path)
+            with gt.GribSet(path) as saved:
+                fields.append(saved.get_values())
+        subset.release()
+    return paths, ma.stack(fields)
+
+
+def test_ensemble_stats(members):
+    paths, fields = members
+    threshold = float(ma.median(fields))
+    stats = gt.ensemble_stats(
+        paths, thresholds=[threshold], workers=2, shortName="t"
+    )
+    assert stats.n_members == 3
+    assert len(stats) == fields.shape[1]
+    assert ma.allclose(stats.get("mean"), fields.mean(axis=0))
+    assert ma.allclose(stats.get("std"), fields.std(axis=0))
+    assert ma.allclose(stats.get("std", ddof=1), fields.std(axis=0, ddof=1))
+    assert ma.allclose(stats.get("min"), fields.min(axis=0))
+    assert ma.allclose(stats.get("max"), fields.max(axis=0))
+    assert np.array_equal(stats.get("count")[:, :100], np.full((2, 100), 2))
+    probability = (fields > threshold).sum(axis=0) / fields.count(axis=0)
+    assert ma.allclose(
+        stats.get("probability", threshold=threshold), probability
+    )
+    with pytest.raises(ValueError):
+        stats.get("probability", threshold=0)
+
+
+def test_ensemble_to_gribset(members, tmp_path):
+    paths, fields = members
+    stats = gt.ensemble_stats(paths, shortName="t")
+    field = stats.fields[0]
+    assert field[0] == "t"
+    with stats.to_gribset("mean") as mean:
+        assert len(mean) == len(stats)
+        assert mean[0]["level"] == field[2]
+        assert np.allclose(
+            mean.get_values(), fields.mean(axis=0), atol=0.05
+        )
+        filename = str(tmp_path / "mean.grb1")
+        mean.save(filename)
+    with gt.GribSet(filename) as saved:
+        assert len(saved) == len(stats)
+
+
+def test_ensemble_lazy_member(members):
+    paths, fields = members
+    stats = gt.EnsembleStats()
+    with gt.GribSet(paths[0], lazy=True) as member:
+        stats.add_member(member, workers=2)
+        # Each handle was released once its field was added
+        assert not any(msg.loaded for msg in member.messages)
+    assert ma.allclose(stats.get("mean"), fields[0])
+
+
+def test_ensemble_missing_without_bitmap(write_grib2):
+    packing_type = "grid_complex_spatial_differencing"
+    paths = [
+        write_grib2(f"mbr{k:03d}.grb2", packing_type, n_missing=10)
+        for k in range(2)
+    ]
+    stats = gt.ensemble_stats(paths)
+    mean = stats.get("mean")
+    assert np.all(ma.getmaskarray(mean)[0, :10])
+    assert not np.any(ma.getmaskarray(mean)[0, 10:])
+    assert np.all(stats.get("count")[0, :10] == 0)
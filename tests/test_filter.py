@@ -28,3 +28,99 @@ def test_filter(grib_name):
             my_filtered_grib = my_grib.filter(
                 asdf=925,
             )
+
+
+def test_filter_cached_columns(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        my_filtered_grib = my_grib.filter(shortName="t", level=925)
+        assert len(my_filtered_grib) == 1
+        assert set(my_grib._columns) == {"shortName", "level"}
+        assert my_filtered_grib._columns["level"].tolist() == [925]
+        assert my_grib[0:2, "shortName"] == ["t", "z"]
+
+
+def test_filter_after_modification(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        n = len(my_grib.filter(level=925))
+        my_grib[0]["level"] = 925
+        assert len(my_grib.filter(level=925)) == n + 1
+
+
+def test_filter_operators(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        levels = my_grib[:, "level"]
+        selected = my_grib.filter(level__in=[850, 925])
+        assert len(selected) == levels.count(850) + levels.count(925)
+        selected = my_grib.filter(level__between=(850, 925))
+        assert all(850 <= lev <= 925 for lev in selected[:, "level"])
+        selected = my_grib.filter(shortName__ne="t", level__gt=500)
+        assert all(msg["shortName"] != "t" for msg in selected)
+        assert all(msg["level"] > 500 for msg in selected)
+        selected = my_grib.filter(level=lambda lev: lev % 100 == 25)
+        assert 925 in selected[:, "level"]
+        assert all(lev % 100 == 25 for lev in selected[:, "level"])
+        selected = my_grib.filter(shortName__not_in=["t", "z"])
+        assert not {"t", "z"} & set(selected[:, "shortName"])
+
+    with pytest.raises(ValueError):
+        gt.GribSet(grib_name).filter(level__between=(1, 2, 3))
+
+
+def test_filter_plan():
+    from gribtool.query import parse, plan
+
+    conditions = parse(
+        {"shortName__ne": "t", "level__in": [850], "step__ge": 0, "level": 1}
+    )
+    order = [key for key, _ in plan(conditions)]
+    assert order == ["level", "step", "shortName"]
+    order = [key for key, _ in plan(conditions, cached_keys=["shortName"])]
+    assert order[0] == "shortName"
+
+
+def test_sort_by(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        sorted_grib = my_grib.sort_by("shortName", "level")
+        rows = list(zip(sorted_grib[:, "shortName"], sorted_grib[:, "level"]))
+        assert rows == sorted(rows)
+        assert len(sorted_grib) == len(my_grib)
+        levels = my_grib.sort_by("level", reverse=True)[:, "level"]
+        assert levels == sorted(levels, reverse=True)
+
+
+def test_groupby_unique(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        groups = my_grib.groupby("shortName", "typeOfLevel")
+        assert sum(len(group) for group in groups.values()) == 362
+        for (short_name, type_of_level), group in groups.items():
+            assert set(group[:, "shortName"]) == {short_name}
+            assert set(group[:, "typeOfLevel"]) == {type_of_level}
+        assert list(my_grib.groupby("shortName")) == my_grib.unique(
+            "shortName"
+        )
+        assert my_grib.unique("shortName")[0:2] == ["t", "z"]
+
+
+def test_filter_caches_partial_reads(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        my_grib.filter(shortName="t", level=925)
+        with gt.stats.profile():
+            filtered = my_grib.filter(shortName="t", level=925)
+        assert len(filtered) == 1
+        assert "grib_get" not in gt.stats.get_stats()
+        # The rest of the column is read when needed
+        assert len(my_grib.filter(level=925)) == len(
+            [msg for msg in my_grib if msg["level"] == 925]
+        )
+        assert "level" not in my_grib._unknown
+
+
+def test_filter_keeps_columns_after_other_changes(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        my_grib.filter(shortName="t")
+        clone = my_grib[0].clone()
+        clone["level"] = 1
+        assert "shortName" in my_grib._cached_columns()
+        my_grib.messages[1]["level"] = 1
+        assert my_grib._cached_columns() == {}
+        clone.release()
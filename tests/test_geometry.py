@@ -0,0 +1,57 @@
+import logging
+
+import numpy as np
+import numpy.ma as ma
+import pytest
+
+import gribtool as gt
+
+logger = logging.getLogger(__name__)
+
+# The test file covers 60N to 31N and 10W to 29E
+BBOX = (50, 0, 40, 10)
+
+
+def test_geometry_shared(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        geometry = my_grib.get_geometry()
+        assert len(geometry) == my_grib[0]["numberOfDataPoints"]
+        assert my_grib[0].get_geometry() is geometry
+        assert my_grib[100].get_geometry() is geometry
+        assert geometry.latitudes.max() == 60
+        assert geometry.longitudes.min() == -10
+        with pytest.raises(ValueError):
+            geometry.latitudes[0] = 0
+
+
+def test_region(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        geometry = my_grib.get_geometry()
+        indices = geometry.region(BBOX)
+        assert geometry.region(BBOX) is indices
+        assert len(indices) == 11 * 11
+        assert geometry.latitudes[indices].min() == 40
+        assert geometry.longitudes[indices].max() == 10
+        # Across the antimeridian of a 0-360 box
+        west = geometry.region((60, 350, 31, 5))
+        assert set(geometry.longitudes[west]) == set(range(-10, 6))
+        with pytest.raises(ValueError):
+            geometry.region((40, 0, 50, 10))
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_get_values_bbox(grib_name, workers):
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib.filter(shortName="t")
+        indices = subset.get_geometry().region(BBOX)
+        values = subset.get_values(bbox=BBOX, workers=workers)
+        assert values.shape == (len(subset), len(indices))
+        assert ma.allequal(values, subset.get_values()[:, indices])
+        subset.release()
+
+
+def test_geometry_lazy(grib_name):
+    gt.geometry.clear_cache()
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        geometry = my_grib.get_geometry()
+        assert np.isclose(geometry.latitudes[-1], 31)
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+
+import numpy.ma as ma
+import pytest
+
+import gribtool as gt
+from gribtool.base import _HandlePool, _Registry
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def max_handles():
+    gt.config.set_config(max_handles=20)
+    yield 20
+    gt.config.set_config(max_handles=None)
+    _HandlePool.messages.clear()
+
+
+def n_loaded(gribset):
+    return sum(msg.loaded for msg in gribset.messages)
+
+
+def test_handle_pool_eager(grib_name, max_handles):
+    with gt.GribSet(grib_name) as my_grib:
+        assert len(my_grib) == 362
+        assert n_loaded(my_grib) <= max_handles
+        levels = [msg["level"] for msg in my_grib]
+        assert len(levels) == 362
+        assert n_loaded(my_grib) <= max_handles
+
+
+def test_handle_pool_values(grib_name, max_handles):
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        subset = my_grib[0:60]
+        expected = [msg.get_values() for msg in subset]
+        assert n_loaded(my_grib) <= max_handles
+        for workers in (None, 4):
+            values = subset.get_values(workers=workers)
+            assert n_loaded(my_grib) <= max_handles
+            for row, other in zip(values, expected):
+                assert ma.allequal(row, other)
+
+
+def test_handle_pool_keeps_modified(grib_name, max_handles):
+    with gt.GribSet(grib_name) as my_grib:
+        msg = my_grib[0]
+        msg["level"] = 123
+        for other in my_grib[1:100]:
+            other["shortName"]
+        assert msg.loaded
+        assert msg["level"] == 123
+
+
+def test_handle_pool_keeps_pinned(grib_name, max_handles):
+    with gt.GribSet(grib_name) as my_grib:
+        msg = my_grib[0]
+        with msg._pinned():
+            for other in my_grib[1:100]:
+                other["shortName"]
+            assert msg.loaded
+            assert id(msg) in _HandlePool.messages
+        assert len(_HandlePool.messages) <= max_handles
+
+
+def test_handle_pool_iter(grib_name):
+    gt.config.set_config(max_handles=10)
+    try:
+        with gt.GribSet(grib_name, lazy=True) as my_grib:
+            for msg in my_grib:
+                pass
+            assert n_loaded(my_grib) <= 10
+            for msg in my_grib:
+                msg["level"]
+            assert n_loaded(my_grib) <= 10
+            assert len(_Registry.refcounts) <= 10
+            assert _Registry.all_gids() == {
+                msg._gid for msg in my_grib.messages if msg.loaded
+            }
+    finally:
+        gt.config.set_config(max_handles=None)
+        _HandlePool.messages.clear()
+
+
+def test_handle_pool_threads(grib_name):
+    gt.config.set_config(max_handles=4, async_workers=8)
+    try:
+        with gt.GribSet(grib_name) as eager:
+            expected = eager[0:20].get_values()
+
+        async def main(gribsets):
+            return await asyncio.gather(
+                *(gribset.aget_values() for gribset in gribsets)
+            )
+
+        gribsets = [
+            gt.GribSet(grib_name, lazy=True)[0:20] for _ in range(8)
+        ]
+        for _ in range(3):
+            for values in asyncio.run(main(gribsets)):
+                assert ma.allequal(values, expected)
+        for gribset in gribsets:
+            gribset.release()
+    finally:
+        gt.config.set_config(max_handles=None, async_workers=None)
+        _HandlePool.messages.clear()
@@ -0,0 +1,56 @@
+import logging
+import os
+import shutil
+
+import gribtool as gt
+from gribtool.index import FileIndex, index_path
+
+logger = logging.getLogger(__name__)
+
+
+def test_build_index(grib_name):
+    index = FileIndex.build(grib_name, keys=["shortName", "level"])
+    assert len(index) == 362
+    assert index.offsets[0] == 0
+    assert index.offsets[1] == index.lengths[0]
+    assert index.values["shortName"][0:2] == ["t", "z"]
+
+
+def test_sidecar_index(grib_name, tmp_path):
+    filename = str(tmp_path / "test.grb")
+    shutil.copy(grib_name, filename)
+    gt.config.set_config(index=True)
+    try:
+        with gt.GribSet(filename) as my_grib:
+            assert os.path.exists(index_path(filename))
+            assert len(my_grib) == 362
+            assert len(my_grib.index) == 362
+            assert my_grib[0, "shortName"] == "t"
+        index = FileIndex.open(filename)
+        assert index.is_valid(filename)
+    finally:
+        gt.config.set_config(index=False)
+
+
+def test_stale_index(grib_name, tmp_path):
+    filename = str(tmp_path / "test.grb")
+    shutil.copy(grib_name, filename)
+    index = FileIndex.open(filename)
+    assert len(index) == 362
+
+    # Append the file to itself, the index must be rebuilt
+    with gt.GribSet(grib_name) as my_grib:
+        (my_grib * 2).save(filename)
+    assert not index.is_valid(filename)
+    assert len(FileIndex.open(filename)) == 724
+
+
+def test_index_dir(grib_name, tmp_path):
+    gt.config.set_config(index_dir=str(tmp_path))
+    try:
+        path = index_path(grib_name)
+        assert os.path.dirname(path) == str(tmp_path)
+        FileIndex.open(grib_name)
+        assert os.path.exists(path)
+    finally:
+        gt.config.set_config(index_dir=None)
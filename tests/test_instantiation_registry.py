@@ -92,13 +92,13 @@ def test_open_from_GribMessages(grib_name):
     assert len(_Registry()) == 2
     assert len(_Registry.gribsets) == 0
     assert len(_Registry.gribmessages) == 2
-    assert _Registry.gribmessages[id(msg1)] == [msg1.gid]
+    assert _Registry.gribmessages[msg1] == {msg1.gid}
+    assert _Registry.refcounts[msg1.gid] == 1
     grib_file = gt.GribSet([msg1, msg2])
     assert len(grib_file) == 2
-    assert (
-        _Registry.gribmessages[id(msg1)][0]
-        == _Registry().gribsets[id(grib_file)][0]
-    )
+    assert _Registry.gribsets[grib_file] == {msg1.gid, msg2.gid}
+    assert _Registry.refcounts[msg1.gid] == 2
+    assert _Registry.find_unique_gids(grib_file) == []
 
 
 def test_release(grib_name):
@@ -118,8 +118,8 @@ def test_registry(grib_name):
     my_grib2 = gt.GribSet(grib_name)
     assert len(_Registry()) == 2
 
-    assert id(my_grib1) in _Registry.gribsets
-    assert id(my_grib2) in _Registry.gribsets
+    assert my_grib1 in _Registry.gribsets
+    assert my_grib2 in _Registry.gribsets
 
     my_grib1.release()
     assert my_grib1.messages == []
@@ -133,3 +133,36 @@ def test_relese_messages(grib_name):
 
     my_grib2.release()
     my_grib3.release()
+
+
+def test_registry_refcounts(grib_name):
+    my_grib = gt.GribSet(grib_name)
+    gids = _Registry.all_gids()
+    assert len(gids) == 362
+    sliced = my_grib[0:10]
+    assert _Registry.all_gids() == gids
+    assert len(_Registry.find_unique_gids(my_grib)) == 352
+    assert _Registry.find_unique_gids(sliced) == []
+    del sliced
+    assert len(_Registry()) == 1
+    assert len(_Registry.find_unique_gids(my_grib)) == 362
+    my_grib.release()
+    assert len(_Registry.all_gids()) == 0
+
+
+def test_registry_all_gids_lazy(grib_name):
+    my_grib = gt.GribSet(grib_name, lazy=True)
+    messages = list(my_grib.messages)
+    for msg in messages:
+        msg["shortName"]
+    filtered = my_grib.filter(indicatorOfParameter=11)
+    loaded = {msg._gid for msg in messages if msg.loaded}
+    assert len(loaded) == 362
+    assert _Registry.all_gids() == loaded
+    del my_grib
+    loaded = {msg._gid for msg in messages if msg.loaded}
+    assert len(loaded) == len(filtered)
+    assert _Registry.all_gids() == loaded
+    filtered.release()
+    assert not any(msg.loaded for msg in messages)
+    assert len(_Registry.all_gids()) == 0
@@ -0,0 +1,52 @@
+import logging
+import os
+
+import numpy.ma as ma
+import pytest
+
+import gribtool as gt
+import gribtool.io
+from gribtool.io import FileReader
+
+logger = logging.getLogger(__name__)
+
+
+def test_copy(grib_name, tmp_path):
+    filename = str(tmp_path / "copy.grb")
+    n = gt.copy(grib_name, filename, shortName="t", level__in=[850, 925])
+    with gt.GribSet(grib_name) as my_grib:
+        expected = my_grib.filter(shortName="t", level__in=[850, 925])
+        with gt.GribSet(filename) as copied:
+            assert len(copied) == n == len(expected)
+            for msg, other in zip(copied, expected):
+                assert msg["level"] == other["level"]
+                assert ma.allequal(msg.get_values(), other.get_values())
+
+
+def test_copy_all_append(grib_name, tmp_path):
+    filename = str(tmp_path / "copy.grb")
+    assert gt.copy(grib_name, filename) == 362
+    assert os.path.getsize(filename) == os.path.getsize(grib_name)
+    assert gt.copy(grib_name, filename, append=True, level=925) > 0
+    with gt.GribSet(filename) as copied:
+        assert len(copied) > 362
+
+
+def test_read_many(grib_name, monkeypatch):
+    with gt.GribSet(grib_name) as my_grib:
+        ranges = [msg._source[1:] for msg in my_grib.messages]
+    reader = FileReader(grib_name)
+    ranges = ranges[5:10] + ranges[20:21] + ranges[0:2]
+    expected = [reader.read(offset, length) for offset, length in ranges]
+    monkeypatch.setattr(gribtool.io, "BATCH_SIZE", 3 * ranges[0][1])
+    assert [bytes(data) for data in reader.read_many(ranges)] == expected
+
+
+def test_copy_into_itself(grib_name, tmp_path):
+    filename = str(tmp_path / "copy.grb")
+    gt.copy(grib_name, filename)
+    size = os.path.getsize(filename)
+    for append in (False, True):
+        with pytest.raises(ValueError):
+            gt.copy(filename, filename, append=append, level=925)
+    assert os.path.getsize(filename) == size
@@ -33,3 +33,49 @@ def test_GribSet_gettitems_fail(grib_name):
         my_grib[1000]
     with pytest.raises(TypeError):
         my_grib["shortName"]
+
+
+def test_key_cache(grib_name, monkeypatch):
+    import gribtool.base
+
+    calls = []
+    grib_get = gribtool.base.grib_get
+
+    def counting_grib_get(*args):
+        calls.append(args[1])
+        return grib_get(*args)
+
+    monkeypatch.setattr(gribtool.base, "grib_get", counting_grib_get)
+    gt.config.set_config(cache_keys=True)
+    try:
+        my_grib = gt.GribSet(grib_name)
+        message = my_grib[0]
+        calls.clear()
+        message.prefetch(["shortName", "level"])
+        assert calls == ["shortName", "level"]
+        assert message["shortName"] == "t"
+        assert message["level"] == 0
+        assert message["shortName", str] == "t"
+        assert calls == ["shortName", "level", "shortName"]
+
+        # Writing a key invalidates the cache
+        message["level"] = 850
+        assert message["level"] == 850
+        assert calls[-1] == "level"
+    finally:
+        gt.config.set_config(cache_keys=False)
+
+
+def test_GribSet_get_keys(grib_name):
+    my_grib = gt.GribSet(grib_name)
+    keys = my_grib.get_keys(["shortName", "level", "indicatorOfTypeOfLevel"])
+    assert keys["shortName"][0:2] == ["t", "z"]
+    assert keys["level"][0] == 0
+    assert len(keys["level"]) == 362
+    assert isinstance(keys["level"][0], int)
+
+    columns = my_grib.get_keys(["level"], as_="numpy")
+    assert columns["level"].dtype.kind == "i"
+
+    with pytest.raises(ValueError):
+        my_grib.get_keys(["level"], as_="xarray")
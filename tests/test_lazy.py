@@ -0,0 +1,112 @@
+import logging
+
+import numpy.ma as ma
+import pytest
+
+import gribtool as gt
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    gt.config.set_config(index=True, index_dir=str(tmp_path))
+    yield
+    gt.config.set_config(index=False, index_dir=None)
+
+
+def test_lazy_open(grib_name, sidecar):
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        assert len(my_grib) == 362
+        assert not any(msg.loaded for msg in my_grib.messages)
+        msg = my_grib[3]
+        assert msg.loaded
+        assert sum(msg.loaded for msg in my_grib.messages) == 1
+        assert my_grib[0:2, "shortName"] == ["t", "z"]
+        assert sum(msg.loaded for msg in my_grib.messages) == 1
+
+
+def test_lazy_values_match(grib_name):
+    with gt.GribSet(grib_name) as eager, gt.GribSet(
+        grib_name, lazy=True
+    ) as lazy:
+        for i in (0, 100, 361):
+            assert eager[i]["shortName"] == lazy[i]["shortName"]
+            assert ma.all(eager[i].get_values() == lazy[i].get_values())
+
+
+def test_lazy_open_without_index(grib_name):
+    with gt.stats.profile():
+        my_grib = gt.GribSet(grib_name, lazy=True)
+    assert "grib_new_from_file" not in gt.stats.get_stats()
+    assert my_grib.index.keys == []
+    # Scanned keys are known without a handle
+    filtered = my_grib.filter(level=925)
+    assert not any(msg.loaded for msg in my_grib.messages)
+    filtered = filtered.filter(shortName="t")
+    assert len(filtered) == 1
+    assert filtered[0]["level"] == 925
+    my_grib.release()
+
+
+def test_lazy_filter(grib_name, sidecar):
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        filtered = my_grib.filter(shortName="t", level=925)
+        assert len(filtered) == 1
+        # The keys are read from the sidecar index
+        assert not any(msg.loaded for msg in my_grib.messages)
+        filtered = my_grib.filter(indicatorOfParameter=11)
+        assert all(msg["shortName"] == "t" for msg in filtered)
+
+
+def test_lazy_iter_mmap(grib_name):
+    gt.config.set_config(mmap=True)
+    try:
+        with gt.GribSet(grib_name, lazy=True) as my_grib:
+            n = 0
+            for msg in my_grib[10:20]:
+                assert msg.loaded
+                n += 1
+            assert n == 10
+    finally:
+        gt.config.set_config(mmap=False)
+
+
+def test_lazy_release(grib_name):
+    my_grib = gt.GribSet(grib_name, lazy=True)
+    for msg in my_grib:
+        pass
+    messages = my_grib.messages
+    my_grib.release()
+    assert not any(msg.loaded for msg in messages)
+
+
+def test_lazy_shared_handles(grib_name, tmp_path):
+    my_grib = gt.GribSet(grib_name, lazy=True)
+
+    def modify():
+        # The filtered set creates the handle and is then collected
+        for msg in my_grib.filter(level=925):
+            msg["level"] = 930
+
+    modify()
+    assert all(msg.loaded for msg in my_grib.messages if msg._modified)
+    my_grib.save(tmp_path / "out.grb1")
+    with gt.GribSet(str(tmp_path / "out.grb1")) as saved:
+        assert len(saved.filter(level=930)) == len(my_grib.filter(level=930))
+        assert len(saved.filter(level=925)) == 0
+    my_grib.release()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_lazy_get_values(grib_name, executor):
+    with gt.GribSet(grib_name) as eager:
+        expected = eager[0:40].get_values()
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        subset = my_grib[0:40]
+        values = subset.get_values(workers=2, executor=executor)
+        assert ma.allequal(values, expected)
+        if executor == "process":
+            # The bytes are sent from the file, keys read without keeping
+            # the handles
+            assert not any(msg.loaded for msg in my_grib.messages)
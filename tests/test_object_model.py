@@ -1,6 +1,7 @@
 import logging
 import os
 
+import numpy as np
 import pytest
 
 import gribtool as gt
@@ -52,3 +53,47 @@ def test_print(grib_name):
     assert len(str(my_grib[0]).split("\n")) == 2
     # print(my_grib[0:5])
     assert len(str(my_grib[0:5]).split("\n")) == 8
+
+
+def test_print_truncated_reads_shown_rows(grib_name):
+    max_rows = gt.config.rcParams.max_rows
+    gt.config.set_config(max_rows=10)
+    try:
+        my_grib = gt.GribSet(grib_name)
+        lines = str(my_grib).split("\n")
+        assert len(lines) == 13
+        assert lines[6] == "..."
+        assert lines[-2] == "362 messages"
+        # Only the rows shown were read, no full column was cached
+        assert set(my_grib._unknown) == set(my_grib._columns)
+        for unknown in my_grib._unknown.values():
+            assert np.count_nonzero(~unknown) == 9
+    finally:
+        gt.config.set_config(max_rows=max_rows)
+
+
+def test_save_raw_and_modified(grib_name, tmp_path):
+    filename = str(tmp_path / "save.grb")
+    my_grib = gt.GribSet(grib_name)
+    subset = my_grib[0:5]
+    subset[1]["level"] = 123
+    subset.save(filename)
+    with gt.GribSet(filename) as saved:
+        assert len(saved) == 5
+        assert saved[:, "level"][1] == 123
+        assert saved[0:1, "shortName"] == my_grib[0:1, "shortName"]
+
+    # Saving over the source file of the messages
+    with gt.GribSet(filename) as saved:
+        saved[3:5].save(filename)
+    with gt.GribSet(filename) as saved:
+        assert len(saved) == 2
+
+
+def test_save_lazy(grib_name, tmp_path):
+    filename = str(tmp_path / "save.grb")
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        my_grib.filter(level=925).save(filename)
+        assert not any(msg.loaded for msg in my_grib.messages)
+    with gt.GribSet(filename) as saved:
+        assert set(saved[:, "level"]) == {925}
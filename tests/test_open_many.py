@@ -0,0 +1,35 @@
+import logging
+import shutil
+
+import gribtool as gt
+
+logger = logging.getLogger(__name__)
+
+
+def test_open_many(grib_name, tmp_path):
+    for member in ("mbr001", "mbr002", "mbr003"):
+        shutil.copy(grib_name, tmp_path / f"{member}_fc2024061800+024.grb1")
+
+    with gt.GribSet.open_many(str(tmp_path / "mbr*.grb1")) as my_grib:
+        assert len(my_grib) == 3 * 362
+        assert not any(msg.loaded for msg in my_grib.messages)
+        selected = my_grib.filter(shortName="t", level=925)
+        assert len(selected) == 3
+        assert not any(msg.loaded for msg in my_grib.messages)
+        assert selected[2]["level"] == 925
+        assert selected.messages[2]._source[0].filename.endswith(
+            "mbr003_fc2024061800+024.grb1"
+        )
+
+
+def test_open_many_list(grib_name, tmp_path):
+    paths = []
+    for member in ("mbr001", "mbr002"):
+        paths.append(str(tmp_path / f"{member}.grb1"))
+        shutil.copy(grib_name, paths[-1])
+    with gt.GribSet.open_many(paths, workers=2) as my_grib:
+        assert len(my_grib) == 2 * 362
+        assert my_grib[361:363, "shortName"] == [
+            my_grib[361]["shortName"],
+            "t",
+        ]
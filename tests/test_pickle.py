@@ -0,0 +1,62 @@
+import logging
+import pickle
+
+import numpy as np
+import numpy.ma as ma
+import pytest
+
+import gribtool as gt
+
+logger = logging.getLogger(__name__)
+
+
+def mean_value(msg):
+    return float(msg.get_values().mean())
+
+
+def test_pickle_message(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        msg = my_grib[3]
+        copied = pickle.loads(pickle.dumps(msg))
+        assert copied.gid != msg.gid
+        assert copied["shortName"] == msg["shortName"]
+        assert ma.allequal(copied.get_values(), msg.get_values())
+        copied.release()
+
+        # Modified messages are sent as their bytes
+        msg["level"] = 1
+        copied = pickle.loads(pickle.dumps(msg))
+        assert copied._source is None
+        assert copied["level"] == 1
+        copied.release()
+
+
+def test_pickle_released_message(grib_name):
+    msg = gt.GribSet(grib_name)[0].clone()
+    msg.release()
+    with pytest.raises(ValueError):
+        pickle.dumps(msg)
+
+
+def test_pickle_gribset(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib[:10]
+        data = pickle.dumps(subset)
+        # Located by offset, not sent as bytes
+        assert len(data) < 10000
+        with pickle.loads(data) as copied:
+            assert len(copied) == 10
+            assert not any(msg.loaded for msg in copied.messages)
+            assert copied[:, "level"] == subset[:, "level"]
+            assert ma.allequal(copied.get_values(), subset.get_values())
+        subset.release()
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_map(grib_name, executor):
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib.filter(shortName="t")
+        expected = subset.map(mean_value)
+        result = subset.map(mean_value, workers=2, executor=executor)
+        assert np.allclose(result, expected)
+        subset.release()
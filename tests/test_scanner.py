@@ -0,0 +1,121 @@
+import logging
+
+import numpy as np
+import pytest
+from gribapi import (
+    grib_get,
+    grib_get_message_offset,
+    grib_new_from_file,
+    grib_new_from_samples,
+    grib_release,
+    grib_set,
+    grib_set_values,
+    grib_write,
+)
+from gribapi.errors import KeyValueNotFoundError
+
+import gribtool as gt
+from gribtool import scanner
+
+logger = logging.getLogger(__name__)
+
+
+def assert_matches_eccodes(filename):
+    scan = scanner.scan(filename)
+    with open(filename, "rb") as f:
+        i = 0
+        while True:
+            gid = grib_new_from_file(f, True)
+            if gid is None:
+                break
+            assert scan.offsets[i] == grib_get_message_offset(gid)
+            assert scan.lengths[i] == grib_get(gid, "totalLength")
+            for key in scanner.SCANNED_KEYS:
+                value = scan.values[key][i]
+                if value is scanner.UNKNOWN:
+                    continue
+                try:
+                    expected = grib_get(gid, key)
+                except KeyValueNotFoundError:
+                    expected = None
+                assert value == expected, (i, key)
+            grib_release(gid)
+            i += 1
+    assert len(scan) == i
+    return scan
+
+
+def test_scan_grib1(grib_name):
+    scan = assert_matches_eccodes(grib_name)
+    assert len(scan) == 362
+    assert scanner.UNKNOWN not in scan.values["level"]
+
+
+def test_scan_grib2(tmp_path):
+    filename = str(tmp_path / "test.grb2")
+    with open(filename, "wb") as f:
+        for type_of_level, level in [
+            ("isobaricInhPa", 850),
+            ("surface", None),
+            ("heightAboveGround", 2),
+            ("potentialVorticity", 2),
+        ]:
+            for unit, step in [(1, 36), (2, 2), (0, 90)]:
+                gid = grib_new_from_samples("regular_ll_pl_grib2")
+                grib_set(gid, "typeOfLevel", type_of_level)
+                if level is not None:
+                    grib_set(gid, "level", level)
+                grib_set(gid, "indicatorOfUnitOfTimeRange", unit)
+                grib_set(gid, "forecastTime", step)
+                grib_write(gid, f)
+                grib_release(gid)
+    scan = assert_matches_eccodes(filename)
+    assert scan.values["step"][:3] == [36, 48, scanner.UNKNOWN]
+
+
+def test_scan_large_grib1(tmp_path):
+    filename = str(tmp_path / "large.grb1")
+    gid = grib_new_from_samples("regular_ll_sfc_grib1")
+    for key, value in [
+        ("Ni", 3600),
+        ("Nj", 1801),
+        ("iDirectionIncrementInDegrees", 0.1),
+        ("jDirectionIncrementInDegrees", 0.1),
+        ("latitudeOfFirstGridPointInDegrees", 90),
+        ("latitudeOfLastGridPointInDegrees", -90),
+        ("longitudeOfFirstGridPointInDegrees", 0),
+        ("longitudeOfLastGridPointInDegrees", 359.9),
+        ("bitsPerValue", 16),
+    ]:
+        grib_set(gid, key, value)
+    grib_set_values(gid, np.random.default_rng(0).normal(size=3600 * 1801))
+    with open(filename, "wb") as f:
+        f.write(b"junk")
+        grib_write(gid, f)
+        grib_write(gid, f)
+    grib_release(gid)
+    scan = assert_matches_eccodes(filename)
+    assert scan.lengths[0] > 0x7FFFFF
+
+
+def test_scan_invalid(tmp_path):
+    filename = str(tmp_path / "truncated.grb1")
+    with open("./tests/mbr001_fc2024061800+024.grb1", "rb") as f:
+        data = f.read(5000)
+    with open(filename, "wb") as f:
+        f.write(data)
+    with pytest.raises(ValueError):
+        scanner.scan(filename)
+
+
+def test_prefilter_handles(grib_name, tmp_path):
+    filename = str(tmp_path / "copy.grb")
+    with gt.stats.profile():
+        n = gt.copy(grib_name, filename, level=25, shortName="t")
+    # Handles are only created for the messages on level 25
+    assert gt.stats.get_stats()["grib_new_from_file"][0] == 5
+    assert n == 1
+    index = gt.FileIndex.build(grib_name, ["level", "dataDate"])
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        assert index.values["level"] == my_grib[:, "level"]
+        assert index.offsets == [msg._source[1] for msg in my_grib.messages]
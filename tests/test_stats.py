@@ -0,0 +1,51 @@
+import json
+import logging
+
+import gribapi
+
+import gribtool as gt
+import gribtool.base
+
+logger = logging.getLogger(__name__)
+
+
+def test_profile(grib_name, tmp_path):
+    with gt.stats.profile():
+        assert gt.stats.is_enabled()
+        with gt.GribSet(grib_name) as my_grib:
+            my_grib.filter(shortName="t", level=850).get_values()
+    assert not gt.stats.is_enabled()
+    assert gribtool.base.grib_get is gribapi.grib_get
+    assert not hasattr(gt.GribSet.filter, "__wrapped__")
+
+    stats = gt.stats.get_stats()
+    # One more call returns None at the end of the file
+    assert stats["grib_new_from_file"][0] == 363
+    assert stats["GribSet.__init__"][0] == 2
+    assert stats["GribSet.filter"][0] == 1
+    assert stats["_decode_into"][0] == 1
+    assert "grib_get" in gt.stats.summary()
+    logger.info("\n" + gt.stats.summary())
+
+    filename = tmp_path / "trace.json"
+    gt.stats.save_trace(filename)
+    with open(filename) as f:
+        events = json.load(f)["traceEvents"]
+    releases = [e for e in events if e["name"] == "GribSet.release"]
+    assert all(event["ph"] == "X" for event in releases)
+    assert max(event["args"]["messages"] for event in releases) == 362
+
+
+def test_profile_geometry(grib_name):
+    gt.geometry.clear_cache()
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        with gt.stats.profile():
+            my_grib[0].get_geometry()
+    assert gt.stats.get_stats()["grib_get_double_array"][0] == 2
+
+
+def test_disabled(grib_name):
+    gt.stats.reset()
+    with gt.GribSet(grib_name, lazy=True) as my_grib:
+        my_grib[0]["level"]
+    assert gt.stats.get_stats() == {}
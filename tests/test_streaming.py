@@ -0,0 +1,49 @@
+import logging
+
+import pytest
+
+import gribtool as gt
+from gribtool.base import _Registry
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize("prefetch", [0, 4])
+def test_stream(grib_name, prefetch):
+    n = 0
+    previous = None
+    for msg in gt.stream(grib_name, prefetch=prefetch):
+        assert isinstance(msg, gt.GribMessage)
+        assert msg.loaded
+        if previous is not None:
+            assert not previous.loaded
+        previous = msg
+        n += 1
+    assert n == 362
+    assert not previous.loaded
+    assert len(_Registry.all_gids()) == 0
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_stream_keys_filter(grib_name, prefetch):
+    with gt.GribSet(grib_name) as my_grib:
+        expected = my_grib.filter(shortName="t", level__ge=500)[:, "level"]
+    rows = list(
+        gt.stream(
+            grib_name,
+            keys=["shortName", "level"],
+            filter={"shortName": "t", "level__ge": 500},
+            headers_only=True,
+            prefetch=prefetch,
+        )
+    )
+    assert [row["level"] for row in rows] == expected
+    assert all(row["shortName"] == "t" for row in rows)
+
+
+def test_stream_early_exit(grib_name):
+    messages = gt.stream(grib_name, prefetch=3)
+    msg = next(messages)
+    assert msg["shortName"] == "t"
+    messages.close()
+    assert not msg.loaded
@@ -81,3 +81,125 @@ def test_missing_values(grib_name):
     msg["bitmapPresent"] = 1
     msg.set_values(values)
     gt.GribSet([msg]).save("missing_values.grib")
+
+
+def test_gribset_get_values(grib_name):
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib[0:10]
+        values = subset.get_values()
+        assert isinstance(values, ma.MaskedArray)
+        assert values.shape == (10, my_grib[0]["numberOfDataPoints"])
+        for i, msg in enumerate(subset):
+            expected = msg.get_values()
+            assert ma.allequal(values[i], expected)
+            assert np.array_equal(ma.getmaskarray(values[i]), expected.mask)
+
+        out = np.empty(values.shape, dtype=np.float32)
+        values32 = subset.to_array(out=out)
+        assert values32.data is out or np.shares_memory(values32.data, out)
+        assert values32.dtype == np.float32
+        assert np.allclose(values32, values)
+
+        with pytest.raises(ValueError):
+            subset.get_values(out=np.empty((1, 1)))
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_gribset_get_values_parallel(grib_name, executor):
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib[0:40]
+        expected = subset.get_values()
+        values = subset.get_values(workers=4, executor=executor)
+        assert ma.allequal(values, expected)
+        assert np.array_equal(ma.getmaskarray(values), expected.mask)
+
+        with pytest.raises(ValueError):
+            subset.get_values(workers=2, executor="cluster")
+
+
+@pytest.mark.parametrize("workers", [None, 3])
+def test_to_cube(grib_name, workers):
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib.filter(typeOfLevel="isobaricInhPa")
+        cube, coords = subset.to_cube(["shortName", "level"], workers=workers)
+        assert list(coords) == ["shortName", "level"]
+        assert coords["level"] == sorted(set(subset[:, "level"]))
+        ni, nj = subset[0]["Ni"], subset[0]["Nj"]
+        assert cube.shape == (
+            len(coords["shortName"]),
+            len(coords["level"]),
+            nj,
+            ni,
+        )
+        for msg in subset:
+            i = coords["shortName"].index(msg["shortName"])
+            j = coords["level"].index(msg["level"])
+            expected = msg.get_values().reshape(nj, ni)
+            assert ma.allequal(cube[i, j], expected)
+
+        with pytest.raises(ValueError):
+            subset.to_cube(["shortName"])
+
+
+def test_set_values_roundtrip(grib_name, tmp_path):
+    filename = str(tmp_path / "set_values.grb")
+    with gt.GribSet(grib_name) as my_grib:
+        msg = my_grib[0]
+        values = msg.get_values()
+        values[0:10] = ma.masked
+        values[10:] = 1.0
+        msg.set_values(values)
+        assert not ma.is_masked(values[10:])
+        gt.GribSet([msg]).save(filename)
+    with gt.GribSet(filename) as saved:
+        result = saved[0].get_values()
+        assert np.all(result.mask[0:10])
+        assert np.allclose(result[10:], 1.0)
+
+
+@pytest.mark.parametrize("workers", [None, 4])
+def test_gribset_set_values(grib_name, tmp_path, workers):
+    filename = str(tmp_path / "set_values.grb")
+    with gt.GribSet(grib_name) as my_grib:
+        subset = my_grib[0:20]
+        values = subset.get_values()
+        values[:, 0:5] = ma.masked
+        values += 1.0
+        subset.set_values(values, workers=workers)
+        subset.save(filename)
+        with pytest.raises(ValueError):
+            subset.set_values(values[1:])
+    with gt.GribSet(filename) as saved:
+        result = saved.get_values()
+        assert np.all(result.mask[:, 0:5])
+        assert np.allclose(result[:, 5:], values[:, 5:], atol=1e-2)
+
+
+def test_missing_without_bitmap(write_grib2):
+    filename = write_grib2(
+        "complex.grb2", "grid_complex_spatial_differencing", 2, n_missing=10
+    )
+    with gt.GribSet(filename) as my_grib:
+        assert my_grib[0]["bitmapPresent"] == 0
+        expected = ma.getmaskarray(my_grib[0].get_values())
+        assert np.count_nonzero(expected) == 10
+        values = my_grib.get_values()
+        assert np.array_equal(ma.getmaskarray(values)[0], expected)
+        assert values.count() == values.size - 20
+        cube, _ = gt.GribSet([my_grib[1]]).to_cube(["shortName"])
+        assert np.array_equal(ma.getmaskarray(cube)[0].ravel(), expected)
+
+
+@pytest.mark.parametrize("packing_type", ["grid_ieee", "grid_jpeg"])
+def test_get_values_float32(write_grib2, packing_type):
+    filename = write_grib2("packed.grb2", packing_type, 2)
+    with gt.GribSet(filename) as my_grib:
+        expected = my_grib.get_values()
+        values = my_grib.get_values(dtype=np.float32)
+        assert values.dtype == np.float32
+        assert np.allclose(values, expected)
+        cube, _ = gt.GribSet([my_grib[0]]).to_cube(
+            ["shortName"], dtype=np.float32
+        )
+        assert cube.dtype == np.float32
+        assert np.allclose(cube[0].ravel(), expected[0])